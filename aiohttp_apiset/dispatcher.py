@@ -1,24 +1,32 @@
 import asyncio
+import collections
 import functools
 import importlib
 import inspect
+import json
 import mimetypes
+import os
+import posixpath
 import re
+import tempfile
 from collections.abc import Container, Iterable, Mapping, MutableMapping, Sized
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
 from itertools import chain
-from pathlib import Path
-from typing import Set  # noqa
+from pathlib import Path, PurePosixPath
+from typing import Dict, Set  # noqa
 from urllib import parse
 
 import yarl
 from aiohttp import hdrs
 from aiohttp.abc import AbstractView
-from aiohttp.web import Response
+from aiohttp.web import FileResponse, Response
 from aiohttp.web_exceptions import (
     HTTPForbidden,
     HTTPMethodNotAllowed,
     HTTPNotFound,
 )
+from multidict import MultiDict
 
 from .compat import (
     AbstractRoute,
@@ -26,6 +34,7 @@ from .compat import (
     MatchInfoError,
     UrlMappingMatchInfo,
 )
+from .utils import LRUCache
 
 
 class Location:
@@ -160,6 +169,10 @@ class Location:
         location = self.add_location(path, resource, name)
         return location.register_route(None, route)
 
+    def unregister_route(self, route):
+        if self._routes.get(route.method) is route:
+            del self._routes[route.method]
+
     def add_location(self, path, resource=None, name=None):
         if resource is None:
             resource = self._resource
@@ -226,6 +239,20 @@ class Location:
         return location
 
 
+def blocking(func):
+    """ Marks sync method of view to be called in executor of view
+
+    >>> class View:
+    ...     executor = None  # default executor of loop
+    ...
+    ...     @blocking
+    ...     def get(self):
+    ...         return Response()
+    """
+    func.blocking = True
+    return func
+
+
 class Route(AbstractRoute):
     def __init__(self, method, handler, resource, *,
                  expect_handler=None, location=None, content_receiver=None,
@@ -316,9 +343,27 @@ class Route(AbstractRoute):
             return cls._wrap_handler(View)
 
         handler = getattr(View, h)
-        signature = inspect.signature(getattr(View(), h))
+        instance = View()
+        signature = inspect.signature(getattr(instance, h))
         handler_kwargs = dict(signature.parameters)
-        if hasattr(View, 'init'):
+        pool_size = getattr(View, 'pool_size', None)
+        release = None
+        if getattr(View, 'singleton', False):
+            async def init(request):
+                return instance
+        elif pool_size:
+            pool = collections.deque([instance], maxlen=pool_size)
+            initial = getattr(View, 'init', None)
+
+            async def init(request):
+                vi = pool.pop() if pool else View()
+                if initial is not None:
+                    await vi.init(request)
+                else:
+                    vi.request = request
+                return vi
+            release = pool.append
+        elif hasattr(View, 'init'):
             async def init(request):
                 vi = View()
                 await vi.init(request)
@@ -328,20 +373,42 @@ class Route(AbstractRoute):
                 vi = View()
                 vi.request = request
                 return vi
-        if not asyncio.iscoroutinefunction(handler):
+
+        is_coroutine = asyncio.iscoroutinefunction(handler)
+        if not is_coroutine and getattr(handler, 'blocking', False):
             func = handler
+            executor = getattr(View, 'executor', None)
+
             async def handler(*args, **kwargs):
-                return func(*args, **kwargs)
+                loop = asyncio.get_event_loop()
+                return await loop.run_in_executor(
+                    executor, functools.partial(func, *args, **kwargs))
+            is_coroutine = True
+
         if 'request' in handler_kwargs:
             @functools.wraps(handler)
             async def wrap_handler(request, *args, **kwargs):
                 vi = await init(request)
-                return await handler(vi, request, *args, **kwargs)
+                try:
+                    result = handler(vi, request, *args, **kwargs)
+                    if is_coroutine:
+                        result = await result
+                finally:
+                    if release is not None:
+                        release(vi)
+                return result
         else:
             @functools.wraps(handler)  # type: ignore
             async def wrap_handler(request, *args, **kwargs):
                 vi = await init(request)
-                return await handler(vi, *args, **kwargs)
+                try:
+                    result = handler(vi, *args, **kwargs)
+                    if is_coroutine:
+                        result = await result
+                finally:
+                    if release is not None:
+                        release(vi)
+                return result
             handler_kwargs['request'] = None  # type: ignore
 
         wrap_handler.__signature__ = signature  # type: ignore
@@ -454,6 +521,8 @@ class RoutesView(Sized, Iterable, Container):
 
 
 class TreeUrlDispatcher(CompatRouter, Mapping):
+    static_workers = 4
+
     def __init__(self, *,
                  resource_factory=TreeResource,
                  route_factory=Route,
@@ -566,18 +635,48 @@ class TreeUrlDispatcher(CompatRouter, Mapping):
 
         return location
 
-    def add_static(self, prefix, path, *, name=None, default=None):
-        from concurrent.futures import ThreadPoolExecutor
-
+    def add_static(self, prefix, path, *, name=None, default=None,
+                   cache_control='no-cache', cache_files=64,
+                   cache_file_size=64 * 1024, executor=None,
+                   precompressed=False, manifest=False):
+        """ Adds route for static files
+
+        :param prefix: url prefix
+        :param path: directory of files
+        :param name: name of route
+        :param default: name of file which is searched in parent
+            directories when requested file not found
+        :param cache_control: value of Cache-Control header
+        :param cache_files: max count of small files kept in memory
+        :param cache_file_size: max size of file kept in memory,
+            larger files and range requests are streamed by FileResponse
+        :param executor: executor for file system calls, by default
+            executor of router with static_workers threads
+        :param precompressed: if True then .br and .gz siblings of file
+            are served for clients which accept these encodings
+        :param manifest: if True then directory is indexed once
+            in StaticManifest and files are searched in memory,
+            manifest is available in route info and may be refreshed
+        :return: resource of route
+        """
         if not prefix.endswith('/'):
             prefix += '/'
 
-        if self._executor is None:
-            self._executor = ThreadPoolExecutor(max_workers=1)
+        if executor is None:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.static_workers)
+            executor = self._executor
 
         if isinstance(path, str):
             path = Path(path)
 
+        cache = LRUCache(cache_files)
+        if manifest:
+            manifest = StaticManifest(path)
+        else:
+            manifest = None
+
         def search(filename, default):
             p = path / filename
 
@@ -601,6 +700,19 @@ class TreeUrlDispatcher(CompatRouter, Mapping):
                     return
                 d = d.parent
 
+        def lookup(filename, default, encodings):
+            p = search(filename, default)
+            if p is None:
+                return
+            ct, _ = mimetypes.guess_type(p.name)
+            for encoding in encodings:
+                c = p.with_name(p.name + PRECOMPRESSED[encoding])
+                try:
+                    return p, c, c.stat(), encoding, ct
+                except OSError:
+                    continue
+            return p, p, p.stat(), None, ct
+
         def read_bytes(p):
             with p.open('br') as f:
                 return f.read()
@@ -615,26 +727,180 @@ class TreeUrlDispatcher(CompatRouter, Mapping):
                     raise HTTPForbidden()
             elif not isinstance(default, str):
                 raise HTTPNotFound()
-            f = await request.app.loop.run_in_executor(
-                self._executor, search, filename, default)
+            if precompressed:
+                encodings = accept_encodings(request)
+            else:
+                encodings = ()
+            loop = request.app.loop
+            if manifest is not None:
+                found = manifest.lookup(filename, default, encodings)
+            else:
+                found = await loop.run_in_executor(
+                    executor, lookup, filename, default, encodings)
 
-            if not f:
+            if not found:
                 raise HTTPNotFound()
+            origin, f, st, encoding, ct = found
 
-            ct, encoding = mimetypes.guess_type(f.name)
             if not ct:
                 ct = 'application/octet-stream'
-            body = await request.app.loop.run_in_executor(
-                self._executor, read_bytes, f)
-            return Response(body=body, content_type=ct)
+            headers = {hdrs.CONTENT_TYPE: ct}
+            if cache_control:
+                headers[hdrs.CACHE_CONTROL] = cache_control
+            if precompressed:
+                headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+            if encoding:
+                headers[hdrs.CONTENT_ENCODING] = encoding
+
+            etag = file_etag(st)
+            headers[hdrs.ETAG] = etag
+            headers[hdrs.LAST_MODIFIED] = formatdate(st.st_mtime, usegmt=True)
+            if not_modified(request, etag, st.st_mtime):
+                del headers[hdrs.CONTENT_TYPE]
+                return Response(status=304, headers=headers)
+
+            if st.st_size > cache_file_size or hdrs.RANGE in request.headers:
+                # FileResponse streams file by chunks and answers
+                # range requests with 206
+                return FileResponse(f, headers=headers)
+            headers[hdrs.ACCEPT_RANGES] = 'bytes'
+
+            try:
+                cached_etag, body = cache[f]
+            except KeyError:
+                cached_etag = None
+            if cached_etag != etag:
+                body = await loop.run_in_executor(executor, read_bytes, f)
+                cache[f] = etag, body
+            return Response(body=body, headers=headers)
 
         route = self.add_route('GET', prefix + '{filename:.*}',
                                content, name=name)
-        route.set_info(prefix=prefix, directory=str(path), default=default)
+        route.set_info(prefix=prefix, directory=str(path), default=default,
+                       manifest=manifest)
 
         return route.resource
 
 
+PRECOMPRESSED = {'br': '.br', 'gzip': '.gz'}
+
+
+class StaticManifest:
+    """ In-memory index of files of static directory
+
+    :param path: directory of files
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._files = {}  # type: Dict[str, tuple]
+        self._dirs = set()  # type: Set[str]
+        self.refresh()
+
+    def __len__(self):
+        return len(self._files)
+
+    def refresh(self):
+        """ Indexes directory again """
+        files = {}
+        dirs = {''}
+        for root, dirnames, filenames in os.walk(str(self._path)):
+            rel = Path(root).relative_to(self._path).as_posix()
+            if rel == '.':
+                rel = ''
+            for name in dirnames:
+                dirs.add(posixpath.join(rel, name))
+            for name in filenames:
+                p = Path(root, name)
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                ct, _ = mimetypes.guess_type(name)
+                files[posixpath.join(rel, name)] = p, st, ct
+        self._files, self._dirs = files, dirs
+
+    def search(self, filename: str, default: str = None):
+        """ Returns relative name of file or default file
+        searched in parent directories
+        """
+        if filename:
+            filename = PurePosixPath(filename).as_posix()
+        if filename in self._dirs:
+            d = filename
+        elif filename in self._files:
+            return filename
+        elif default:
+            d = posixpath.dirname(filename)
+        else:
+            return
+        if not default:
+            return
+        while True:
+            name = posixpath.join(d, default)
+            if name in self._files:
+                return name
+            elif not d:
+                return
+            d = posixpath.dirname(d)
+
+    def lookup(self, filename: str, default: str = None, encodings=()):
+        name = self.search(filename, default)
+        if name is None:
+            return
+        origin, st, ct = self._files[name]
+        for encoding in encodings:
+            compressed = self._files.get(name + PRECOMPRESSED[encoding])
+            if compressed is not None:
+                return origin, compressed[0], compressed[1], encoding, ct
+        return origin, origin, st, None, ct
+
+
+def accept_encodings(request):
+    """ Returns precompressed encodings accepted by client
+    in order of preference
+
+    >>> from aiohttp.test_utils import make_mocked_request
+    >>> accept_encodings(make_mocked_request(
+    ...     'GET', '/', headers={'Accept-Encoding': 'gzip, br;q=0'}))
+    ['gzip']
+    """
+    accepted = set()
+    for item in request.headers.get(hdrs.ACCEPT_ENCODING, '').split(','):
+        encoding, *params = item.strip().lower().split(';')
+        if any(p.strip() in ('q=0', 'q=0.0') for p in params):
+            continue
+        accepted.add(encoding.strip())
+    return [e for e in PRECOMPRESSED if e in accepted]
+
+
+def file_etag(st) -> str:
+    """ Returns ETag of file by stat like aiohttp FileResponse """
+    return '"{:x}-{:x}"'.format(st.st_mtime_ns, st.st_size)
+
+
+def not_modified(request, etag: str, mtime: float = None) -> bool:
+    """ Checks If-None-Match and If-Modified-Since headers of request
+
+    :param request: Request
+    :param etag: current ETag of resource
+    :param mtime: current time of modification as timestamp,
+        if None then If-Modified-Since is ignored
+    :return: True if client has actual version of resource
+    """
+    if_none_match = request.headers.get(hdrs.IF_NONE_MATCH)
+    if if_none_match is not None:
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*' or tag.replace('W/', '', 1) == etag:
+                return True
+        return False
+    if mtime is None:
+        return False
+    ims = request.if_modified_since
+    return ims is not None and int(mtime) <= ims.timestamp()
+
+
 async def form_receiver(request):
     try:
         return await request.post()
@@ -644,6 +910,136 @@ async def form_receiver(request):
         raise ValueError('Bad form')
 
 
+class SpooledFile:
+    """ File of multipart form kept in memory up to spool_size
+    and in temporary file above
+
+    :param name: name of field
+    :param filename: name of file
+    :param content_type: content type of file
+    :param headers: headers of part
+    :param file: SpooledTemporaryFile
+    """
+
+    def __init__(self, name, filename, content_type, headers, file):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.headers = headers
+        self.file = file
+        self.size = 0
+
+    def __repr__(self):
+        return '<{cls} {name} filename={filename!r} size={size}>'.format(
+            cls=type(self).__name__, name=self.name,
+            filename=self.filename, size=self.size)
+
+    @property
+    def in_memory(self) -> bool:
+        return not getattr(self.file, '_rolled', True)
+
+    async def _call(self, func, *args):
+        if self.in_memory:
+            return func(*args)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def write(self, data: bytes):
+        await self._call(self.file.write, data)
+        self.size += len(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return await self._call(self.file.read, size)
+
+    def seek(self, offset: int = 0):
+        return self.file.seek(offset)
+
+    def close(self):
+        self.file.close()
+
+
+class MultipartReceiver:
+    """ Streaming receiver of multipart/form-data
+
+    Parts with filename are spooled into SpooledFile, other parts
+    are decoded to str. Size of field is limited by maxLength
+    of formData parameter of route and by max_size.
+
+    :param spool_size: max size of file kept in memory
+    :param max_size: max size of any field, if None then unlimited
+    :param chunk_size: size of chunk read from request
+    """
+
+    def __init__(self, *, spool_size=1024 * 1024, max_size=None,
+                 chunk_size=64 * 1024):
+        self.spool_size = spool_size
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+
+    def _limit(self, request, name):
+        route = getattr(request.match_info, 'route', None)
+        limits = getattr(route, 'field_limits', None) or {}
+        limit = limits.get(name)
+        if limit is None:
+            return self.max_size
+        elif self.max_size is None:
+            return limit
+        return min(limit, self.max_size)
+
+    async def __call__(self, request):
+        try:
+            reader = await request.multipart()
+        except Exception:
+            raise ValueError('Bad form')
+        result = MultiDict()
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            limit = self._limit(request, part.name)
+            if part.filename is None:
+                value = await self._read_field(part, limit)
+            else:
+                value = await self._read_file(part, limit)
+            result.add(part.name, value)
+        return result
+
+    def _check(self, part, size, limit):
+        if limit is not None and size > limit:
+            raise ValueError('Field {} is too large'.format(part.name))
+
+    async def _read_field(self, part, limit):
+        data = bytearray()
+        while True:
+            chunk = await part.read_chunk(self.chunk_size)
+            if not chunk:
+                break
+            data.extend(chunk)
+            self._check(part, len(data), limit)
+        charset = part.get_charset(default='utf-8')
+        return data.decode(charset)
+
+    async def _read_file(self, part, limit):
+        f = SpooledFile(
+            part.name, part.filename,
+            part.headers.get(hdrs.CONTENT_TYPE),
+            part.headers,
+            tempfile.SpooledTemporaryFile(max_size=self.spool_size),
+        )
+        try:
+            while True:
+                chunk = await part.read_chunk(self.chunk_size)
+                if not chunk:
+                    break
+                self._check(part, f.size + len(chunk), limit)
+                await f.write(chunk)
+        except BaseException:
+            f.close()
+            raise
+        f.seek(0)
+        return f
+
+
 async def json_receiver(request):
     try:
         return await request.json()
@@ -653,15 +1049,91 @@ async def json_receiver(request):
         raise ValueError('Bad json')
 
 
+class JsonReceiver:
+    """ Receiver of application/json which decodes large body in executor
+
+    :param offload_size: min size of body decoded in executor
+    :param executor: executor, if None then default executor of loop
+    :param loads: function for decode json
+    """
+
+    def __init__(self, *, offload_size=64 * 1024, executor=None,
+                 loads=json.loads):
+        self.offload_size = offload_size
+        self.executor = executor
+        self.loads = loads
+
+    def _decode(self, body, charset):
+        try:
+            return self.loads(body.decode(charset))
+        except ValueError as e:
+            raise ValueError(str(e)) from None
+        except Exception:
+            raise ValueError('Bad json')
+
+    async def __call__(self, request):
+        try:
+            body = await request.read()
+        except Exception:
+            raise ValueError('Bad json')
+        charset = request.charset or 'utf-8'
+        if len(body) < self.offload_size:
+            return self._decode(body, charset)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, self._decode, body, charset)
+
+
 async def stream_receiver(request):
     body = await request.read()
     if len(body):
         return body
 
 
+class StreamReceiver:
+    """ Receiver of application/octet-stream without reading of body
+
+    Body parameter is StreamReader of request or,
+    if chunked, async iterator of memoryview chunks.
+
+    :param chunked: pass async iterator instead of StreamReader
+    :param chunk_size: size of chunk, if None then chunks as received
+    """
+
+    def __init__(self, *, chunked=False, chunk_size=None):
+        self.chunked = chunked
+        self.chunk_size = chunk_size
+
+    async def __call__(self, request):
+        if not request.body_exists:
+            return None
+        elif self.chunked:
+            return self._iter_chunks(request.content)
+        return request.content
+
+    async def _iter_chunks(self, content):
+        if self.chunk_size:
+            chunks = content.iter_chunked(self.chunk_size)
+        else:
+            chunks = content.iter_any()
+        async for chunk in chunks:
+            yield memoryview(chunk)
+
+
 class ContentReceiver(MutableMapping):
-    def __init__(self):
+    """ Mapping of mimetype to receiver of request body
+
+    Besides exact mimetype receiver is looked up by structured
+    suffix (application/vnd.api+json -> application/json)
+    and by wildcard (application/*, */*).
+    Resolved receiver is cached per raw Content-Type header.
+
+    :param cache_size: max count of cached Content-Type headers
+    """
+
+    def __init__(self, *, cache_size=256):
         self._frozen = False
+        self._cache = LRUCache(cache_size)
         self._map = {
             'multipart/form-data': form_receiver,
             'application/x-www-form-urlencoded': form_receiver,
@@ -672,11 +1144,35 @@ class ContentReceiver(MutableMapping):
     def freeze(self):
         self._frozen = True
 
+    def resolve(self, mimetype):
+        """ Returns receiver for mimetype or None
+
+        :param mimetype: mimetype without parameters
+        """
+        m = self._map
+        if mimetype in m:
+            return m[mimetype]
+        elif not mimetype or '/' not in mimetype:
+            return m.get('*/*')
+        maintype, subtype = mimetype.split('/', 1)
+        if '+' in subtype:
+            suffix = '{}/{}'.format(maintype, subtype.rsplit('+', 1)[1])
+            if suffix in m:
+                return m[suffix]
+        wildcard = maintype + '/*'
+        if wildcard in m:
+            return m[wildcard]
+        return m.get('*/*')
+
     async def receive(self, request):
+        raw = request.headers.get(hdrs.CONTENT_TYPE, '')
         try:
-            receiver = self._map[request.content_type]
+            receiver = self._cache[raw]
         except KeyError:
-            raise TypeError(request.content_type) from None
+            receiver = self.resolve(request.content_type)
+            self._cache[raw] = receiver
+        if receiver is None:
+            raise TypeError(request.content_type)
         return await receiver(request)
 
     def __setitem__(self, key, value):
@@ -684,12 +1180,14 @@ class ContentReceiver(MutableMapping):
             raise RuntimeError('Cannot add receiver '
                                'to frozen ContentReceiver')
         self._map[key] = value
+        self._cache.clear()
 
     def __delitem__(self, key):
         if self._frozen:
             raise RuntimeError('Cannot del receiver '
                                'from frozen ContentReceiver')
         del self._map[key]
+        self._cache.clear()
 
     def __getitem__(self, key):
         return self._map[key]
@@ -1,22 +1,69 @@
 import json
 from collections import defaultdict
-from collections.abc import Mapping
+from collections.abc import Mapping, MutableMapping  # noqa
+from typing import Optional  # noqa
 
 from aiohttp.web_exceptions import HTTPBadRequest
 
 
-class Errors(Mapping):
-    def __init__(self, *args, **kwargs):
-        self._errors = args
-        self._child_errors = {}
-        for k, v in kwargs.items():
-            if isinstance(v, str):
-                v = Errors(v)
-            elif isinstance(v, (list, tuple)):
-                v = Errors(*v)
-            elif not isinstance(v, Errors):
-                raise ValueError(v)
-            self._child_errors[k] = v
+class ErrorsMixin:
+    """ Tree of errors
+
+    Own errors are kept as ordered set, nodes are stored in tree
+    only on write, so reading of absent path does not change tree.
+    """
+    __slots__ = ()
+
+    # trees are compared by identity as exceptions are,
+    # equality of Mapping recurses through own errors at key None
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def _init(self, args, kwargs):
+        self._errors = dict.fromkeys(args) if args else None
+        self._child_errors = None
+        self._parent = None
+        self._key = None
+        if kwargs:
+            children = self._child_errors = {}
+            for k, v in kwargs.items():
+                if isinstance(v, str):
+                    v = Errors(v)
+                elif isinstance(v, (list, tuple)):
+                    v = Errors(*v)
+                elif not isinstance(v, Errors):
+                    raise ValueError(v)
+                children[k] = v
+
+    def _attach(self):
+        parent = self._parent
+        if parent is None:
+            return
+        self._parent = None
+        siblings = parent._children()
+        node = siblings.setdefault(self._key, self)
+        if node is not self:
+            # same path was written through other node
+            self._errors = node._own()
+            self._child_errors = node._children()
+
+    def _own(self):
+        errors = self._errors
+        if errors is None:
+            self._attach()
+            errors = self._errors
+            if errors is None:
+                errors = self._errors = {}
+        return errors
+
+    def _children(self):
+        children = self._child_errors
+        if children is None:
+            self._attach()
+            children = self._child_errors
+            if children is None:
+                children = self._child_errors = {}
+        return children
 
     def __getitem__(self, item):
         if item is None:
@@ -25,30 +72,47 @@ class Errors(Mapping):
             item = item,
         err = self
         for i in item:
-            err = err._child_errors.setdefault(i, Errors())
+            children = err._child_errors
+            child = None if children is None else children.get(i)
+            if child is None:
+                child = Errors()
+                child._parent = err
+                child._key = i
+            err = child
         return err
 
     def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
         return self[item]
 
+    def __contains__(self, item):
+        if item is None:
+            return bool(self._errors)
+        children = self._child_errors
+        return children is not None and item in children
+
     def __iter__(self):
         if self._errors:
             yield
-        yield from self._child_errors
+        if self._child_errors:
+            yield from self._child_errors
 
     def __len__(self):
-        return len(self._child_errors) + bool(self._errors)
+        children = self._child_errors
+        return (len(children) if children else 0) + bool(self._errors)
 
     def __repr__(self, level=0):
         result = ''
         if not level:
             result = '<{}'.format(type(self).__name__)
         pref = ''
-        if self._child_errors:
+        children = self._child_errors or {}
+        if children:
             pref = '\n' + '  ' * (level + 1)
         if self._errors:
             result += pref + repr(set(self._errors))
-        for k, v in self._child_errors.items():
+        for k, v in children.items():
             result += pref + str(k) + ': ' + v.__repr__(level + 1)
         if level:
             return result
@@ -62,8 +126,8 @@ class Errors(Mapping):
 
         if path:
             self[path].add(value)
-        elif value not in self._errors:
-            self._errors += value,
+        else:
+            self._own()[value] = None
 
     def extend(self, seq):
         for i in seq:
@@ -74,21 +138,31 @@ class Errors(Mapping):
             for val in values:
                 self.add(val)
         elif isinstance(values, Errors):
-            self.extend(values._errors)
-            for k, v in values._child_errors.items():
+            self.extend(values._errors or ())
+            for k, v in (values._child_errors or {}).items():
                 self[k].update(v)
         else:
             raise ValueError(values)
 
+    def shape(self):
+        """ Returns hashable representation of tree """
+        children = self._child_errors
+        return (
+            tuple(self._errors) if self._errors else (),
+            tuple((k, v.shape()) for k, v in children.items())
+            if children else (),
+        )
+
     def to_tree(self, self_key='.'):
-        if self._child_errors:
+        children = self._child_errors
+        if children:
             pass
         elif self._errors:
             return list(self._errors)
         else:
             return
         result = {}
-        for k, v in self._child_errors.items():
+        for k, v in children.items():
             value = v.to_tree(self_key=self_key)
             if value:
                 result[str(k)] = value
@@ -101,7 +175,7 @@ class Errors(Mapping):
         result = defaultdict(list)
         if self._errors:
             result[path if path else separator] = list(self._errors)
-        for k, v in self._child_errors.items():
+        for k, v in (self._child_errors or {}).items():
             if path is not None:
                 k = separator.join((path, str(k)))
             for p, e in v.to_flat(separator=separator, path=str(k)).items():
@@ -109,14 +183,57 @@ class Errors(Mapping):
         return result
 
 
-class ValidationError(Errors, HTTPBadRequest):  # type: ignore
+class Errors(ErrorsMixin, Mapping):
+    __slots__ = ('_errors', '_child_errors', '_parent', '_key')
+
+    def __init__(self, *args, **kwargs):
+        self._init(args, kwargs)
+
+
+class FrozenErrors(Errors):
+    """ Empty Errors which cannot be changed """
+    __slots__ = ()
+
+    def _own(self):
+        raise RuntimeError('Frozen')
+
+    _children = _own
+
+
+NO_ERRORS = FrozenErrors()
+
+
+class ValidationError(ErrorsMixin, HTTPBadRequest):  # type: ignore
+    """ Errors of request rendered as json response
+
+    Rendered bodies may be memoized by shape of tree,
+    e.g. ValidationError.render_cache = LRUCache(1024),
+    and rendered by other function, e.g. ValidationError.dumps = ujson.dumps
+    """
+    dumps = staticmethod(json.dumps)
+    render_cache = None  # type: Optional[MutableMapping]
+
     def __init__(self, *args, **kwargs):
         HTTPBadRequest.__init__(self)
-        Errors.__init__(self, *args, **kwargs)
+        self._init(args, kwargs)
         self._reason = self
 
-    async def prepare(self, request, dumps=json.dumps):
-        self.text = dumps({'errors': self.to_tree()})
+    def render(self, dumps=None) -> str:
+        if dumps is None:
+            # function set to class is not bound to instance
+            dumps = type(self).dumps
+        cache = self.render_cache
+        if cache is None:
+            return dumps({'errors': self.to_tree()})
+        key = dumps, self.shape()
+        try:
+            return cache[key]
+        except KeyError:
+            text = cache[key] = dumps({'errors': self.to_tree()})
+            return text
+
+    async def prepare(self, request, dumps=None):
+        self.text = self.render(dumps)
         self.content_type = 'application/json'
         return await super().prepare(request)
 
@@ -129,4 +246,8 @@ class ValidationError(Errors, HTTPBadRequest):  # type: ignore
             HTTPBadRequest.update(self, arg, **kwargs)
 
     def __bool__(self):
-        return bool(Errors.__len__(self))
+        return bool(ErrorsMixin.__len__(self))
+
+
+# ValidationError cannot inherit Errors, slots conflict with BaseException
+Errors.register(ValidationError)
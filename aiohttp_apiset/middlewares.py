@@ -4,7 +4,8 @@ from typing import Any, Callable, Dict, List, Tuple  # noqa
 
 from aiohttp import web
 
-from .utils import import_obj
+from .exceptions import Errors
+from .utils import LRUCache, import_obj
 
 
 DEFAULT_CONVERTERS = (
@@ -46,7 +47,11 @@ class JsonEncoder(json.JSONEncoder):
 class Jsonify:
     encoder = JsonEncoder
 
-    def __init__(self, *, converters=None, default_repr=True, **kwargs):
+    def __init__(self, *, converters=None, default_repr=True,
+                 errors_cache_size=0, **kwargs):
+        self._errors_cache = None
+        if errors_cache_size:
+            self._errors_cache = LRUCache(errors_cache_size)
         if converters is None:
             converters = DEFAULT_CONVERTERS
         self.converters = []
@@ -85,7 +90,17 @@ class Jsonify:
         return web.json_response(data, status=status, dumps=self.dumps)
 
     def resolve_exception(self, ex):
-        if not isinstance(ex.reason, str):
+        reason = ex.reason
+        if isinstance(reason, Errors) and self._errors_cache is not None:
+            key = ex.status, reason.shape()
+            cache = self._errors_cache
+            try:
+                text = cache[key]
+            except KeyError:
+                text = cache[key] = self.dumps({'errors': reason})
+            return web.Response(
+                text=text, status=ex.status, content_type='application/json')
+        elif not isinstance(reason, str):
             return self.response(errors=ex.reason, status=ex.status)
         elif ex.status > 399:
             return self.response(error=ex.reason, status=ex.status)
@@ -5,15 +5,24 @@ import os
 import sys
 from collections import ChainMap, OrderedDict
 from collections.abc import Hashable, Mapping
-from functools import lru_cache
 from itertools import chain
 from pathlib import Path
-from typing import Dict, Optional, Sequence, Tuple, Union  # noqa
+from typing import (  # noqa
+    Callable,
+    Dict,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import yaml.resolver
 from yaml.constructor import ConstructorError
 from yaml.nodes import MappingNode
 
+from ..utils import LRUCache
+
 
 try:
     from yaml.cyaml import CLoader as YamlLoader
@@ -62,7 +71,56 @@ class FrozenDict(OrderedDict):
         return super().clear()
 
 
+class InternStats:
+    """ Statistics of interned strings of loaded document
+
+    :param strings: count of interned strings
+    :param duplicates: count of strings replaced by interned one
+    :param saved: approximate count of saved bytes
+    """
+
+    def __init__(self):
+        self.strings = 0
+        self.duplicates = 0
+        self.saved = 0
+
+    def __repr__(self):
+        return '<{cls} strings={s.strings} duplicates={s.duplicates} ' \
+               'saved={s.saved}>'.format(cls=type(self).__name__, s=self)
+
+
 class Loader(YamlLoader):
+    """ Loader of specification
+
+    Mapping keys and short strings are interned, so equal strings
+    of a large specification are stored once. If stats_hook is set
+    then it's called with InternStats after loading of document.
+    """
+    intern_max_length = 64
+    stats_hook = None  # type: Optional[Callable[[InternStats], None]]
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.intern_stats = InternStats()
+
+    def get_single_data(self):
+        data = super().get_single_data()
+        if self.stats_hook is not None:
+            self.stats_hook(self.intern_stats)
+        return data
+
+    def construct_yaml_str(self, node):
+        value = super().construct_yaml_str(node)
+        if len(value) > self.intern_max_length:
+            return value
+        stats = self.intern_stats
+        interned = sys.intern(value)
+        stats.strings += 1
+        if interned is not value:
+            stats.duplicates += 1
+            stats.saved += sys.getsizeof(value)
+        return interned
+
     def construct_yaml_map(self, node):
         data = FrozenDict()
         yield data
@@ -87,16 +145,187 @@ class Loader(YamlLoader):
 
 
 Loader.add_constructor('tag:yaml.org,2002:map', Loader.construct_yaml_map)
+Loader.add_constructor('tag:yaml.org,2002:str', Loader.construct_yaml_str)
+
+
+class FrozenMap(dict):
+    """ Compact read-only mapping
+
+    >>> m = FrozenMap(a=1)
+    >>> m['a']
+    1
+    >>> m['b'] = 2
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Frozen
+    """
+    __slots__ = ()
+
+    def _frozen(self, *args, **kwargs):
+        raise RuntimeError('Frozen')
+
+    __setitem__ = __delitem__ = __ior__ = _frozen  # type: ignore
+    pop = popitem = clear = update = setdefault = _frozen  # type: ignore
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+class CompactLoader(Loader):
+    """ Loader which builds FrozenMap with interned keys
+    instead of FrozenDict, it takes less memory for large specifications
+    """
+    intern_max_length = 256
+
+    def construct_yaml_map(self, node):
+        data = FrozenMap()
+        yield data
+        dict.update(data, self.construct_mapping(node))
+
+    def construct_mapping(self, node, deep=False):
+        if isinstance(node, MappingNode):
+            self.flatten_mapping(node)
+        mapping = {}
+        for key_node, value_node in node.value:
+            key = self.construct_object(key_node, deep=deep)
+            if not isinstance(key, Hashable):
+                raise ConstructorError(
+                    "while constructing a mapping", node.start_mark,
+                    "found unhashable key", key_node.start_mark)
+            mapping[key] = self.construct_object(value_node, deep=deep)
+        return FrozenMap(mapping)
+
+
+CompactLoader.add_constructor(
+    'tag:yaml.org,2002:map', CompactLoader.construct_yaml_map)
+
+
+class SchemaCache:
+    """ Storage of loaded specification files
+
+    Loaders and routers created with the same instance share
+    parsed files, instances without explicit cache use
+    :data:`default_cache`. After router.freeze() the cache
+    may be cleared to release parsed specifications,
+    evicted and cleared files are parsed again on access.
+    Bounded cache keeps references of files only while
+    one specification is loaded.
+
+    :param maxsize: max count of files in every storage,
+        if None then unbounded
+    :param yaml_loader: yaml loader class, CompactLoader takes
+        less memory than default Loader
+    """
+
+    def __init__(self, maxsize=None, yaml_loader=None):
+        self.maxsize = maxsize
+        self.yaml_loader = yaml_loader or Loader
+        self.data = LRUCache(maxsize)  # type: Dict[Tuple[Path, str], dict]
+        self.files = LRUCache(maxsize)  # type: Dict[Path, SchemaFile]
+        self.names = LRUCache(maxsize)  # type: Dict[str, SchemaFile]
+        self.swagger_files = LRUCache(maxsize)  # type: Dict[str, dict]
+        self.paths = {}  # type: Dict[str, Path]
+        self.local_refs = {}  # type: Dict[tuple, Mapping]
+        self.ref_tree = {}  # type: Dict[str, Mapping]
+        self.mtimes = {}  # type: Dict[Path, Optional[int]]
+        self.resolved_refs = {}  # type: Dict[Tuple[Path, tuple], Mapping]
+        self.resolving_refs = set()  # type: Set[Tuple[Path, tuple]]
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self, path: Path, encoding) -> dict:
+        key = path, encoding
+        try:
+            return self.data[key]
+        except KeyError:
+            pass
+        mtime = self._mtime(path)
+        with path.open(encoding=encoding) as f:
+            data = yaml.load(f, self.yaml_loader)
+        self.data[key] = data
+        self.mtimes[path] = mtime
+        return data
+
+    def changed(self) -> Sequence[Path]:
+        """ Returns loaded files which modified on disk """
+        return [
+            path for path, mtime in self.mtimes.items()
+            if self._mtime(path) != mtime
+        ]
+
+    def invalidate(self, paths) -> None:
+        """ Forget files for parse them again on next access
+
+        :param paths: sequence of Path
+        """
+        paths = set(paths)
+        for key in [k for k in self.data if k[0] in paths]:
+            del self.data[key]
+        for path in paths:
+            self.files.pop(path, None)
+            self.mtimes.pop(path, None)
+        for name in [k for k, v in self.names.items() if v.path in paths]:
+            del self.names[name]
+        # local refs are stored without file and resolved refs
+        # may contain data of any file, so forget all of them
+        self.clear_refs()
+
+    def clear_refs(self):
+        """ Forget references collected by resolving of files """
+        self.local_refs.clear()
+        self.ref_tree.clear()
+        self.resolved_refs.clear()
+
+    def clear(self):
+        """ Forget parsed files, names of files are kept
+        for loading them again on request
+        """
+        self.data.clear()
+        self.files.clear()
+        self.names.clear()
+        self.swagger_files.clear()
+        self.mtimes.clear()
+        self.clear_refs()
+
+    def __repr__(self):
+        return '<{cls} maxsize={maxsize} files={files}>'.format(
+            cls=type(self).__name__,
+            maxsize=self.maxsize,
+            files=len(self.files),
+        )
+
 
+default_cache = SchemaCache()
 
-@lru_cache(None)
-def yaml_load(path: Path, encoding) -> dict:
-    with path.open(encoding=encoding) as f:
-        return yaml.load(f, Loader)
+
+class CacheAttribute:
+    """ Proxy to storage of SchemaCache of class or instance """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            cache = owner.cache
+        else:
+            cache = instance.cache
+        return getattr(cache, self.name)
+
+
+def yaml_load(path: Path, encoding, cache=None) -> dict:
+    if cache is None:
+        cache = default_cache
+    return cache.load(path, encoding)
 
 
 class SwaggerLoaderMixin:
-    swagger_files = {}  # type: Dict[str, SchemaFile]
+    cache = default_cache  # type: SchemaCache
+    swagger_files = CacheAttribute('swagger_files')
     _encoding = None  # type: Optional[str]
 
     @classmethod
@@ -265,22 +494,27 @@ class AllOf(Copyable, ChainMap):
 
 
 class SchemaFile(Copyable, Mapping):
-    files = {}  # type: Dict[Path, SchemaFile]
-    local_refs = {}  # type: Dict[str, SchemaFile]
-
-    def __new__(cls, path, *args, **kwargs):
-        if path in cls.files:
-            return cls.files[path]
-        else:
-            inst = super().__new__(cls)
-            inst.__init__(path, *args, **kwargs)
-            cls.files[inst.path] = inst
+    cache = default_cache  # type: SchemaCache
+    files = CacheAttribute('files')
+    local_refs = CacheAttribute('local_refs')
+
+    def __new__(cls, path, *args, cache=None, **kwargs):
+        if cache is None:
+            cache = cls.cache
+        inst = cache.files.get(path)
+        if type(inst) is cls:
             return inst
-
-    def __init__(self, path, encoding='utf-8'):
+        inst = super().__new__(cls)
+        inst.__init__(path, *args, cache=cache, **kwargs)
+        cache.files[inst.path] = inst
+        return inst
+
+    def __init__(self, path, encoding='utf-8', cache=None):
+        if cache is not None:
+            self.cache = cache
         self._path = path
         self._encoding = encoding
-        self._data = yaml_load(path, encoding=encoding)
+        self._data = yaml_load(path, encoding=encoding, cache=self.cache)
 
     @property
     def data(self):
@@ -307,7 +541,7 @@ class SchemaFile(Copyable, Mapping):
         path = self.find_path(path)
         if path in self.files:
             return self.files[path]
-        return type(self)(path)
+        return type(self)(path, cache=self.cache)
 
     def __getitem__(self, item):
         if item in self._data:
@@ -368,6 +602,15 @@ class SchemaFile(Copyable, Mapping):
 class IncludeSwaggerPaths(SchemaPointer):
     INCLUDE = '$include'
 
+    def __init__(self, schema_file, data):
+        super().__init__(schema_file, data)
+        # index of prefixes: lengths for longest match and includes
+        self._lengths = sorted({len(p) for p in self._data}, reverse=True)
+        self._includes = {
+            pref: tuple(self._get_includes(methods))
+            for pref, methods in self._data.items()
+        }
+
     @classmethod
     def _get_includes(cls, methods):
         if isinstance(methods, list):
@@ -384,7 +627,7 @@ class IncludeSwaggerPaths(SchemaPointer):
             if '$ref' in methods:
                 yield pref, self._file(methods['$ref'])
                 continue
-            includes = self._get_includes(methods)
+            includes = self._includes[pref]
             if not includes:
                 yield pref, SchemaPointer.factory(self._file, methods)
                 continue
@@ -399,23 +642,30 @@ class IncludeSwaggerPaths(SchemaPointer):
             yield uri
 
     def __getitem__(self, item):
-        data = sorted(self._data.items(), key=lambda x: -len(x[0]))
-        for pref, methods in data:
-            if item.startswith(pref):
-                if '$ref' in methods and len(pref) == len(item):
-                    return self._file(methods['$ref'])
-                includes = self._get_includes(methods)
-                if not includes and len(pref) == len(item):
-                    return SchemaPointer.factory(self._file, methods)
-                subitem = item[len(pref):]
-                for i in includes:
-                    f = self._file(i)
-                    basePath = f.get('basePath', '')
-                    i = subitem[len(basePath):]
-                    try:
-                        return f['paths'][i]
-                    except KeyError:
-                        pass
+        size = len(item)
+        for length in self._lengths:
+            if length > size:
+                continue
+            pref = item[:length]
+            if pref not in self._data:
+                continue
+            methods = self._data[pref]
+            exact = length == size
+            if exact and '$ref' in methods:
+                return self._file(methods['$ref'])
+            includes = self._includes[pref]
+            if not includes and exact:
+                return SchemaPointer.factory(self._file, methods)
+            subitem = item[length:]
+            for i in includes:
+                f = self._file(i)
+                basePath = f.get('basePath', '')
+                if not subitem.startswith(basePath):
+                    continue
+                try:
+                    return f['paths'][subitem[len(basePath):]]
+                except KeyError:
+                    pass
         raise KeyError(item)
 
     def __len__(self):
@@ -424,8 +674,6 @@ class IncludeSwaggerPaths(SchemaPointer):
 
 class ExtendedSchemaFile(SchemaFile):
     include = IncludeSwaggerPaths
-    files = {}  # type: Dict[Path, SchemaFile]
-    local_refs = {}  # type: Dict[str, SchemaFile]
 
     @classmethod
     def class_factory(cls, *, include):
@@ -437,6 +685,7 @@ class ExtendedSchemaFile(SchemaFile):
         self, path: Path,
         dirs: Sequence[Path] = (),
         encoding='utf-8',
+        cache: Optional[SchemaCache] = None,
     ):
         if not isinstance(path, Path):
             path = Path(path)
@@ -456,20 +705,23 @@ class ExtendedSchemaFile(SchemaFile):
             path = Path(path.name)
         self._dirs = tuple(dirs)
         self._cache = {}  # type: Dict[Union[Path, str], Path]
+        self._paths = None  # type: Optional[IncludeSwaggerPaths]
         path = self.find_path(path)
-        super().__init__(path, encoding=encoding)
+        super().__init__(path, encoding=encoding, cache=cache)
         self._ref_replaced = False
 
     def __getitem__(self, item):
-        if item == 'paths':
-            return self.include(self, self._data['paths'])
-        return super().__getitem__(item)
+        if item != 'paths':
+            return super().__getitem__(item)
+        elif self._paths is None:
+            self._paths = self.include(self, self._data['paths'])
+        return self._paths
 
     def factory(self, path):
         path = self.find_path(path)
         if path in self.files:
             return self.files[path]
-        return type(self)(path, self._dirs)
+        return type(self)(path, self._dirs, cache=self.cache)
 
     def find_path(self, path):
         if path in self._cache:
@@ -502,7 +754,7 @@ class ExtendedSchemaFile(SchemaFile):
         raise FileNotFoundError(path)
 
     def resolve(self):
-        data = self._resolve_reference(self._data)
+        data = dict(self._resolve_reference(self._data))
         paths = OrderedDict()
         for pref, methods in data['paths'].items():
             includes = self.include._get_includes(methods)
@@ -517,11 +769,42 @@ class ExtendedSchemaFile(SchemaFile):
         data['paths'] = paths
         return data
 
-    def _resolve_reference(self, data):
-        # if self._ref_replaced and data is self._data:
-        #     return data
-        # self._ref_replaced = True
+    def _resolve_pointer(self, rel):
+        """ Returns resolved data by json pointer of this file
+
+        Result is memoized per (file, pointer) in cache. A pointer
+        which is already being resolved (cyclic references between
+        files) is returned as is, like a local reference.
+        """
+        key = self._path, tuple(rel)
+        resolved = self.cache.resolved_refs
+        if key in resolved:
+            return resolved[key]
+
+        resolving = self.cache.resolving_refs
+        if key in resolving:
+            return self._get_pointer(rel)
+        resolving.add(key)
+        try:
+            data = self._get_pointer(rel, self._resolve_reference)
+            data = self._resolve_reference(data)
+        finally:
+            resolving.discard(key)
+        resolved[key] = data
+        return data
+
+    def _get_pointer(self, rel, resolve=None):
+        data = self._data
+        for p in rel:
+            if isinstance(data, list):
+                p = int(p)
+            data = data[p]
+            if resolve is not None and \
+                    isinstance(data, dict) and '$ref' in data:
+                data = resolve(data)
+        return data
 
+    def _resolve_reference(self, data):
         if not isinstance(data, (dict, list)):
             return data
 
@@ -530,29 +813,35 @@ class ExtendedSchemaFile(SchemaFile):
         if is_dict and '$ref' in data:
             f, rel = self.resolve_uri(data['$ref'])
 
-            if f is self:
-                data = self._data
-            else:
-                data = f._resolve_reference(f._data)
+            if f is not self:
+                return f._resolve_pointer(rel)
 
+            data = self._data
             for p in rel:
                 data = data[p]
-
-            if f is self:
-                self.local_refs[tuple(rel)] = data
+            self.local_refs[tuple(rel)] = data
             return data
 
         if is_dict:
             gen = data.items()
-            data = dict(data)
         else:
             gen = enumerate(data)
-            data = list(data)
+
+        result = None
         for k, v in gen:
             new_v = self._resolve_reference(v)
-            if new_v is not v:
-                data[k] = new_v
-        return data
+            if new_v is v:
+                continue
+            elif result is not None:
+                pass
+            elif is_dict:
+                result = dict(data)
+            else:
+                result = list(data)
+            result[k] = new_v
+        if result is None:
+            return data
+        return result
 
 
 def get_ref(spec: dict, ref: str):
@@ -598,9 +887,13 @@ def deref(data, spec: dict):
 
 
 class BaseLoader:
-    def __init__(self, search_dirs=(), encoding='utf-8'):
+    cache = default_cache  # type: SchemaCache
+
+    def __init__(self, search_dirs=(), encoding='utf-8', cache=None):
         self._search_dirs = list(search_dirs)
         self._encoding = encoding
+        if cache is not None:
+            self.cache = cache
 
     @property
     def search_dirs(self):
@@ -619,18 +912,27 @@ class BaseLoader:
 class FileLoader(BaseLoader):
     file_factory = ExtendedSchemaFile
     data_factory = SchemaPointer
-    files = {}  # type: Dict[str, SchemaFile]
-    local_refs = {}  # type: Dict[str, SchemaFile]
+    files = CacheAttribute('names')
+    local_refs = CacheAttribute('ref_tree')
 
-    def _update_mapping(self, f: SchemaFile) -> None:
-        sd = sorted(self.search_dirs)
-        for k, v in f.files.items():
-            for d in sd:
-                try:
-                    self.files[str(k.relative_to(d))] = v
-                    break
-                except ValueError:
-                    continue
+    def _name(self, path: Path) -> Optional[str]:
+        for d in sorted(self.search_dirs):
+            try:
+                return str(path.relative_to(d))
+            except ValueError:
+                continue
+        return None
+
+    def _update_mapping(self) -> None:
+        # parsed files may be already evicted from bounded cache
+        for k in tuple(self.cache.mtimes):
+            name = self._name(k)
+            if name is not None:
+                self.cache.paths[name] = k
+        for k, v in tuple(self.cache.files.items()):
+            name = self._name(k)
+            if name is not None:
+                self.files[name] = v
 
     def _merge(self, refs, data):
         d = dict(data)
@@ -663,20 +965,48 @@ class FileLoader(BaseLoader):
         return self._merge(refs, f)
 
     def __getitem__(self, item):
-        return self.files[item]
+        try:
+            return self.files[item]
+        except KeyError:
+            path = self.cache.paths[item]
+        # file is evicted from cache, parse it again
+        f = self.file_factory(
+            path, dirs=self._search_dirs,
+            encoding=self._encoding,
+            cache=self.cache,
+        )
+        self.files[item] = f
+        return f
 
     @classmethod
     def class_factory(cls, *, include):
         file = cls.file_factory.class_factory(include=include)
         return type(cls.__name__, (cls,), {'file_factory': file})
 
-    def load(self, path):
+    def __init__(self, search_dirs=(), encoding='utf-8', cache=None,
+                 lazy=False):
+        super().__init__(search_dirs, encoding=encoding, cache=cache)
+        self.lazy = lazy
+
+    def load(self, path, *, lazy=None):
+        """ Returns loaded specification
+
+        :param path: path to specification
+        :param lazy: if True then references are not resolved
+            until data is requested, by default the loader mode is used
+        """
+        if self.cache.maxsize is not None:
+            self.cache.clear_refs()
         result = self.file_factory(
             path, dirs=self._search_dirs,
             encoding=self._encoding,
+            cache=self.cache,
         )
-        self.warm_up(result)
-        self._update_mapping(result)
+        if lazy is None:
+            lazy = self.lazy
+        if not lazy:
+            self.warm_up(result)
+        self._update_mapping()
         return self._set_local_refs(result)
 
     def warm_up(self, file: SchemaFile) -> Mapping:
@@ -685,13 +1015,14 @@ class FileLoader(BaseLoader):
 
     def resolve_data(self, data):
         result = self.data_factory.factory(self, data)
-        self._update_mapping(self.file_factory)
+        self._update_mapping()
         return result
 
     def __call__(self, ref):
         path, rel_path = ref.split('#', 1)
-        f = self.file_factory(path, self._search_dirs, self._encoding)
-        self._update_mapping(f)
+        f = self.file_factory(path, self._search_dirs, self._encoding,
+                              cache=self.cache)
+        self._update_mapping()
         return f('#' + rel_path)
 
 
@@ -0,0 +1,192 @@
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, FrozenSet, List, Optional  # noqa
+
+from ..exceptions import Errors
+from .route import SwaggerValidationRoute, route_factory
+from .validate import Validator
+
+
+JSON_TYPES = ('application/json',)
+
+_validators = {}  # type: Dict[int, Validator]
+
+
+def _init_worker(table, validator_class):
+    _validators.clear()
+    for key, schema in table.items():
+        _validators[key] = validator_class(schema)
+
+
+def _validate(key, parameters, name, body, charset, content_type):
+    errors = Errors()
+    try:
+        parameters[name] = json.loads(body.decode(charset))
+    except ValueError as e:
+        errors[content_type].add(str(e))
+    else:
+        parameters = _validators[key].validate(parameters, errors)
+    return parameters, errors.to_tree()
+
+
+def update_errors(errors, tree, path=(), self_key='.'):
+    """ Fills errors from result of Errors.to_tree
+
+    :param errors: instance of Errors
+    :param tree: dict or list
+    :param path: tuple of keys
+    :param self_key: key of own errors in tree
+    """
+    if isinstance(tree, list):
+        errors[path].update(tree)
+        return
+    for k, v in tree.items():
+        if k == self_key:
+            update_errors(errors, v, path)
+        else:
+            update_errors(errors, v, path + (k,))
+
+
+class RawBody(bytes):
+    """ Body of request which is decoded in worker of pool """
+    charset = 'utf-8'
+
+
+class PoolValidationRoute(SwaggerValidationRoute):
+    """ Route which validates json body in ValidationPool """
+    validation_pool = None  # type: Optional[ValidationPool]
+    pool_key = None  # type: Optional[int]
+
+    def _build(self, swagger_data, loader):
+        state = super()._build(swagger_data, loader)
+        state['_body_name'] = None
+        for name, param in state['_parameters'].items():
+            if param['in'] == 'body':
+                state['_body_name'] = name
+        return state
+
+    def _pooled(self, request, state):
+        pool = self.validation_pool
+        if pool is None or state.get('_body_name') is None:
+            return False
+        elif request.content_type not in pool.content_types:
+            return False
+        return (request.content_length or 0) >= pool.min_size
+
+    async def _receive(self, request, errors, state):
+        if not self._pooled(request, state):
+            return await super()._receive(request, errors, state)
+        body = await request.read()
+        if body:
+            body = RawBody(body)
+            body.charset = request.charset or body.charset
+            return body
+
+    def _offload(self, request, state):
+        return self._pooled(request, state) or \
+            super()._offload(request, state)
+
+    async def _validate_offload(self, parameters, errors, state):
+        name = state['_body_name']
+        body = parameters.get(name)
+        if not isinstance(body, RawBody):
+            return await super()._validate_offload(parameters, errors, state)
+        del parameters[name]
+        return await self.validation_pool.validate(
+            self, parameters, bytes(body), errors,
+            charset=body.charset, body_name=name)
+
+
+class ValidationPool:
+    """ Pool of processes which validate large json bodies
+
+    Workers build validators once from table of schemas of routes.
+    Loop sends raw body and receives converted data and errors.
+
+    Usage::
+
+        pool = ValidationPool(min_size=1024 * 1024)
+        router = SwaggerRouter(route_factory=pool.route_factory)
+        ...
+        pool.close()
+
+    :param max_workers: count of processes
+    :param min_size: min Content-Length of body validated in pool
+    :param content_types: content types decoded as json in pool
+    :param validator_class: class of Validator for workers
+    """
+    route_class = PoolValidationRoute
+
+    def __init__(self, max_workers=None, *, min_size=0,
+                 content_types=JSON_TYPES, validator_class=Validator):
+        self.max_workers = max_workers
+        self.min_size = min_size
+        self.content_types = content_types
+        self.validator_class = validator_class
+        self._routes = []  # type: List[PoolValidationRoute]
+        self._executor = None  # type: Optional[ProcessPoolExecutor]
+        self._keys = frozenset()  # type: FrozenSet[int]
+
+    def route_factory(self, *args, **kwargs):
+        kwargs.setdefault('validation_route_class', self.route_class)
+        route = route_factory(*args, **kwargs)
+        if isinstance(route, PoolValidationRoute):
+            route.validation_pool = self
+            route.pool_key = len(self._routes)
+            self._routes.append(route)
+        return route
+
+    def table(self):
+        """ Returns schemas of built routes by key """
+        return {
+            r.pool_key: r.validation_schema
+            for r in self._routes if r.is_built
+        }
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            table = self.table()
+            self._keys = frozenset(table)
+            self._executor = ProcessPoolExecutor(
+                self.max_workers,
+                initializer=_init_worker,
+                initargs=(table, self.validator_class),
+            )
+        return self._executor
+
+    async def validate(self, route, parameters, body, errors, *,
+                       charset=None, content_type=JSON_TYPES[0],
+                       body_name=None):
+        """ Returns parameters with decoded and validated body
+
+        :param route: PoolValidationRoute
+        :param parameters: parameters of request without body
+        :param body: raw body
+        :param errors: Errors which is filled by errors of workers
+        :param charset: charset of body
+        :param content_type: key of errors of decoding
+        :param body_name: name of body parameter, by default
+            of the current state of route
+        """
+        if body_name is None:
+            body_name = route._state['_body_name']
+        if route.pool_key not in self._keys:
+            # route is built after start of workers
+            self.close(wait=False)
+        loop = asyncio.get_event_loop()
+        parameters, tree = await loop.run_in_executor(
+            self.executor, _validate, route.pool_key, parameters,
+            body_name, body, charset or 'utf-8', content_type)
+        if tree:
+            update_errors(errors, tree)
+        return parameters
+
+    def close(self, *, wait=True):
+        """ Shutdown workers, next validation starts new ones
+        with actual schemas
+        """
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
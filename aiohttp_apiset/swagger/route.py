@@ -1,15 +1,111 @@
+import asyncio
+import json
+import logging
+import random
 from collections.abc import Mapping
-from typing import Dict, Tuple, Union  # noqa
+from concurrent.futures import Executor  # noqa
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union  # noqa
 
 from aiohttp import web
 
 from ..dispatcher import Route
-from ..exceptions import ValidationError
+from ..exceptions import NO_ERRORS, Errors, ValidationError
 from ..utils import allOf
+from .loader import FrozenMap
 from .operations import get_docstring_swagger
+from .serializer import compile_serializer
 from .validate import Validator, convert, get_collection
 
 
+logger = logging.getLogger(__name__)
+
+
+class ResponseSampler:
+    """ Validates sampled responses by schema of operation
+
+    Response is validated in executor after handler returned it,
+    mismatches are reported to callback in loop.
+
+    :param callback: callable(route, request, status, errors),
+        if None then mismatches are logged
+    :param rate: share of validated responses from 0 to 1,
+        e.g. 1 for canary workers
+    :param executor: executor, if None then default executor of loop
+    """
+
+    def __init__(self, callback=None, *, rate=0.01, executor=None):
+        self.callback = callback or self.log
+        self.rate = rate
+        self.executor = executor
+
+    def sample(self) -> bool:
+        rate = self.rate
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    @staticmethod
+    def log(route, request, status, errors):
+        logger.warning(
+            'Response %s of %s %s does not match schema: %s',
+            status, request.method, request.path, errors.to_tree())
+
+    @staticmethod
+    def _validate(route, status, data):
+        validator = route.response_validator(status)
+        if validator is None:
+            return
+        if isinstance(data, web.Response):
+            body = data.body
+            if data.content_type != 'application/json' or \
+                    not isinstance(body, (bytes, bytearray)):
+                return
+            data = json.loads(body)
+        errors = Errors()
+        validator.validate(data, errors, convert=False)
+        return errors
+
+    def check(self, route, request, response):
+        """ Schedules validation of response
+
+        :param route: SwaggerRoute
+        :param request: Request
+        :param response: result of handler
+        """
+        if isinstance(response, web.StreamResponse):
+            if not isinstance(response, web.Response):
+                return
+            status = response.status
+        else:
+            status = 200
+
+        def done(future):
+            if future.cancelled():
+                return
+            elif future.exception() is not None:
+                logger.error('Response validation failed',
+                             exc_info=future.exception())
+                return
+            errors = future.result()
+            if errors:
+                self.callback(route, request, status, errors)
+
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(
+            self.executor, self._validate, route, status, response)
+        future.add_done_callback(done)
+
+
+class StateAttribute:
+    """ Proxy to table of state of built route """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance._state[self.name]
+
+
 class SwaggerRoute(Route):
     """
     :param method: as well as in aiohttp
@@ -18,18 +114,38 @@ class SwaggerRoute(Route):
     :param expect_handler: as well as in aiohttp
     :param location: SubLocation instance
     :param swagger_data: data
+
+    Validation of request with Content-Length at least offload_size
+    is called in offload_executor (default executor of loop if None),
+    set them in subclass and select it in route_factory.
     """
     errors_factory = ValidationError
+    offload_size = None  # type: Optional[int]
+    offload_executor = None  # type: Optional[Executor]
+    _parameters = StateAttribute('_parameters')
+    _required = StateAttribute('_required')
+    field_limits = StateAttribute('field_limits')
+    _responses = StateAttribute('_responses')
+    _response_validators = StateAttribute('_response_validators')
+    _serializer = StateAttribute('_serializer')
+    _ordered_parameters = StateAttribute('_ordered_parameters')
 
     def __init__(self, method, handler, resource, *,
                  expect_handler=None, location=None,
-                 swagger_data=None):
+                 swagger_data=None, content_receiver=None):
         super().__init__(method, handler,
                          expect_handler=expect_handler,
-                         resource=resource, location=location)
-        self._parameters = {}
-        self._required = []
+                         resource=resource, location=location,
+                         content_receiver=content_receiver)
+        # tables built from operation, replaced only as a whole
+        self._state = FrozenMap(self._empty_state())
+        self.response_sampler = None  # type: Optional[ResponseSampler]
+        self.serialize_response = False
+        self.early_reject = False
         self._swagger_data = swagger_data
+        self._bind = self._make_binder()
+        # data is validated by schemas only in subclasses
+        self._validates = type(self)._validate is not SwaggerRoute._validate
         self.is_built = False
 
     @property
@@ -44,77 +160,210 @@ class SwaggerRoute(Route):
         if self.is_built:
             return
         self.is_built = True
-        self._required = []
-        self._parameters = {}
-        if not self._swagger_data:
-            return
+        self._set_state(self._build(self._swagger_data, loader))
+
+    def update_swagger_data(self, swagger_data, loader) -> bool:
+        """ Replace operation and rebuild parameters of built route
+
+        :param swagger_data: new operation
+        :param loader: loader of schema
+        :return: True if parameters of route was changed
+        """
+        state = self._build(swagger_data, loader)
+        old = self._state
+        changed = any(
+            old.get(k) != state[k] for k in ('_parameters', '_required')
+        )
+        self._swagger_data = swagger_data
+        if changed or not self.is_built:
+            self.is_built = True
+            self._set_state(state)
+        else:
+            # parameters are kept, validation uses tables of old state
+            self._set_state(dict(
+                old,
+                _responses=state['_responses'],
+                _response_validators=state['_response_validators'],
+                _serializer=state['_serializer'],
+            ))
+        return changed
+
+    def _set_state(self, state):
+        # State is replaced by one assignment, a request reads it once
+        # and sees either the old or the new tables till its end.
+        self._state = FrozenMap(state)
+
+    @staticmethod
+    def _empty_state() -> Dict[str, Any]:
+        return {
+            '_parameters': {},
+            '_required': [],
+            'field_limits': {},
+            '_responses': {},
+            '_response_validators': {},
+            '_serializer': None,
+            '_ordered_parameters': (),
+        }
+
+    def _build(self, swagger_data, loader) -> dict:
+        state = self._empty_state()
+        required = state['_required']  # type: List[str]
+        parameters = state['_parameters']  # type: Dict[str, dict]
+        field_limits = state['field_limits']  # type: Dict[str, int]
+        responses = state['_responses']  # type: Dict[str, Mapping]
+        if not swagger_data:
+            return state
         elif loader is not None:
-            data = loader.resolve_data(self._swagger_data).copy()
+            data = loader.resolve_data(swagger_data).copy()
         else:
-            data = self._swagger_data
+            data = swagger_data
+
+        for code, response in (data.get('responses') or {}).items():
+            if isinstance(response, Mapping) and 'schema' in response:
+                responses[str(code)] = response['schema']
+        if self.serialize_response and '200' in responses:
+            state['_serializer'] = compile_serializer(responses['200'])
 
         for param in data.get('parameters', ()):
             p = param.copy()
             if loader is None:
                 p = allOf(p)
             name = p.pop('name')
-            self._parameters[name] = p
+            parameters[name] = p
             if p.pop('required', False):
-                self._required.append(name)
+                required.append(name)
+            if p['in'] == 'formData' and 'maxLength' in p:
+                # limit in bytes, utf-8 takes up to 4 bytes per char
+                if p.get('type') == 'file':
+                    field_limits[name] = p['maxLength']
+                else:
+                    field_limits[name] = p['maxLength'] * 4
+        state['_ordered_parameters'] = tuple(sorted(
+            parameters.items(),
+            key=lambda x: x[1]['in'] in ('body', 'formData'),
+        ))
+        return state
 
-    async def handler(self, request):
-        parameters, errors = await self.validate(request)
-        ha = self._handler_args
-        kw = self._handler_kwargs
+    def _make_binder(self):
+        """ Returns function which binds parameters to handler arguments
 
-        if errors and 'errors' not in ha:
-            raise errors
+        Plan of binding is computed once from signature of handler
+        """
+        ha = self._handler_args
+        with_errors = 'errors' in ha
+        with_request = 'request' in ha
+        args = tuple(k for k in ha if k not in ('errors', 'request'))
+        # arguments without default are passed as None when missing
+        nones = tuple(
+            k for k in args
+            if ha[k] and ha[k].default == ha[k].empty
+        )
+
+        if self._handler_kwargs:
+            def bind(parameters, errors, request):
+                for k in nones:
+                    if k not in parameters:
+                        parameters[k] = None
+                if with_errors:
+                    parameters['errors'] = errors
+                if with_request:
+                    parameters['request'] = request
+                return parameters
+        elif not nones:
+            def bind(parameters, errors, request):
+                kwargs = {k: parameters[k] for k in args if k in parameters}
+                if with_errors:
+                    kwargs['errors'] = errors
+                if with_request:
+                    kwargs['request'] = request
+                return kwargs
+        else:
+            def bind(parameters, errors, request):
+                kwargs = dict.fromkeys(nones)
+                for k in args:
+                    if k in parameters:
+                        kwargs[k] = parameters[k]
+                if with_errors:
+                    kwargs['errors'] = errors
+                if with_request:
+                    kwargs['request'] = request
+                return kwargs
+
+        bind.with_errors = with_errors  # type: ignore
+        return bind
 
-        request.update(parameters)
-        if 'errors' in ha:
-            parameters['errors'] = errors
-        if 'request' in ha:
-            parameters['request'] = request
+    async def handler(self, request):
+        state = self._state
+        parameters, errors = await self.validate(request, state)
+        bind = self._bind
 
-        if kw:
-            parameters, ps = parameters, parameters
-        else:
-            parameters, ps = {}, parameters
-        for k, p in ha.items():
-            if k in parameters:
-                continue
-            elif k in ps:
-                parameters[k] = ps[k]
-            elif p and p.default == p.empty:
-                parameters[k] = None
+        if errors:
+            if not bind.with_errors:
+                raise errors
+        elif bind.with_errors:
+            errors = self.errors_factory()
 
-        response = await self._handler(**parameters)
+        request.update(parameters)
+        response = await self._handler(**bind(parameters, errors, request))
+        serializer = state['_serializer']
+        if serializer is not None and \
+                not isinstance(response, web.StreamResponse):
+            response = serializer(response)
+        sampler = self.response_sampler
+        if sampler is not None and state['_responses'] and \
+                sampler.sample():
+            sampler.check(self, request, response)
         return response
 
-    def _validate(self, data, errors):
+    def response_validator(self, status):
+        """ Returns Validator of response schema for status or None
+
+        :param status: status code of response
+        """
+        key = str(status)
+        try:
+            return self._response_validators[key]
+        except KeyError:
+            pass
+        schema = self._responses.get(key, self._responses.get('default'))
+        validator = None if schema is None else Validator(schema)
+        self._response_validators[key] = validator
+        return validator
+
+    def _validate(self, data, errors, state):
         return data
 
-    async def validate(self,
-                       request: web.Request) -> Tuple[Dict, ValidationError]:
+    def _validate_early(self, data, errors, state):
+        """ Validates parameters extracted before body,
+        returns errors which may be None
+        """
+        return errors
+
+    async def validate(
+        self, request: web.Request, state: Optional[Mapping] = None,
+    ) -> Tuple[Dict, Union[ValidationError, Errors]]:
         """ Returns parameters extract from request and multidict errors
 
         :param request: Request
-        :return: tuple of parameters and errors
+        :param state: state of route, by default the current one,
+            it is used for whole validation even if route is rebuilt
+        :return: tuple of parameters and errors, errors is read-only
+            NO_ERRORS if request is valid
         """
-        parameters = {}
-        files = {}
-        errors = self.errors_factory()
+        if state is None:
+            state = self._state
+        required = state['_required']
+        parameters = {}  # type: Dict[str, Any]
+        files = None
+        # collector of errors is created only when something may fail,
+        # errors_factory is created only for invalid request
+        errors = None  # type: Optional[Errors]
         body = None
+        received = False
 
-        if request.method in request.POST_METHODS:
-            try:
-                body = await self._content_receiver.receive(request)
-            except ValueError as e:
-                errors[request.content_type].add(str(e))
-            except TypeError:
-                errors[request.content_type].add('Not supported content type')
-
-        for name, param in self._parameters.items():
+        # parameters of body follow path, query and header parameters,
+        # body is read only if operation has them
+        for name, param in state['_ordered_parameters']:
             where = param['in']
             schema = param.get('schema', param)
             vtype = schema['type']
@@ -126,18 +375,32 @@ class SwaggerRoute(Route):
                 source = request.headers
             elif where == 'path':
                 source = request.match_info
-            elif body is None:
-                source = ()
-            elif where == 'formData':
-                source = body
-            elif where == 'body':
-                if isinstance(body, BaseException):
-                    errors[name].add(str(body))
-                else:
-                    parameters[name] = body
-                continue
             else:
-                raise ValueError(where)
+                if not received:
+                    if self.early_reject:
+                        errors = self._validate_early(
+                            parameters, errors, state)
+                        if errors:
+                            return parameters, self._errors(errors)
+                    received = True
+                    if request.method in request.POST_METHODS:
+                        if errors is None:
+                            errors = Errors()
+                        body = await self._receive(request, errors, state)
+                if body is None:
+                    source = ()
+                elif where == 'formData':
+                    source = body
+                elif where == 'body':
+                    if isinstance(body, BaseException):
+                        if errors is None:
+                            errors = Errors()
+                        errors[name].add(str(body))
+                    else:
+                        parameters[name] = body
+                    continue
+                else:
+                    raise ValueError(where)
 
             if is_array and hasattr(source, 'getall'):
                 collection_format = param.get('collectionFormat')
@@ -156,7 +419,7 @@ class SwaggerRoute(Route):
                 value = get_collection(source, name,
                                        collection_format, default)
                 if param.get('minItems') and not value \
-                        and name not in self._required:
+                        and name not in required:
                     continue
             elif isinstance(source, Mapping) and name in source and (
                 vtype not in ('number', 'integer') or source[name] != ''
@@ -165,7 +428,9 @@ class SwaggerRoute(Route):
             elif 'default' in param:
                 parameters[name] = param['default']
                 continue
-            elif name in self._required:
+            elif name in required:
+                if errors is None:
+                    errors = Errors()
                 errors[name].add('Required')
                 if isinstance(source, BaseException):
                     errors[name].add(str(body))
@@ -182,42 +447,108 @@ class SwaggerRoute(Route):
             if source is body and isinstance(body, dict):
                 pass
             elif vtype not in ('string', 'file'):
+                if errors is None:
+                    errors = Errors()
                 value = convert(name, value, vtype, vformat, errors)
 
             if vtype == 'file':
+                if files is None:
+                    files = {}
                 files[name] = value
             else:
                 parameters[name] = value
 
-        parameters = self._validate(parameters, errors)
-        parameters.update(files)
-        return parameters, errors
+        if self._validates:
+            if errors is None:
+                errors = Errors()
+            if self._offload(request, state):
+                parameters = await self._validate_offload(
+                    parameters, errors, state)
+            else:
+                parameters = self._validate(parameters, errors, state)
+        if files:
+            parameters.update(files)
+        if not errors:
+            return parameters, NO_ERRORS
+        return parameters, self._errors(errors)
+
+    def _errors(self, errors):
+        result = self.errors_factory()
+        result.update(errors)
+        return result
+
+    async def _receive(self, request, errors, state):
+        try:
+            return await self._content_receiver.receive(request)
+        except ValueError as e:
+            errors[request.content_type].add(str(e))
+        except TypeError:
+            errors[request.content_type].add('Not supported content type')
+
+    def _offload(self, request, state):
+        size = self.offload_size
+        return size is not None and (request.content_length or 0) >= size
+
+    async def _validate_offload(self, parameters, errors, state):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.offload_executor, self._validate, parameters, errors, state)
 
 
 class SwaggerValidationRoute(SwaggerRoute):
-    def build_swagger_data(self, loader):
-        if self.is_built:
-            return
-        super().build_swagger_data(loader)
+    _validator = StateAttribute('_validator')
+
+    def _build(self, swagger_data, loader):
+        state = super()._build(swagger_data, loader)
         schema = {
             'type': 'object',
             'properties': {
                 k: v.get('schema', v)
-                for k, v in self._parameters.items()
+                for k, v in state['_parameters'].items()
                 if v.get('schema', v).get('type') != 'file'
             },
         }
+        # path, query and header parameters are checked
+        # before reading of body in early_reject mode
+        early = {
+            k: v for k, v in schema['properties'].items()
+            if state['_parameters'][k]['in'] not in ('body', 'formData')
+        }
+        if len(early) == len(schema['properties']):
+            early = {}
         try:
-            self._validator = Validator(schema)
+            state['_validator'] = Validator(schema)
+            state['_early_validator'] = Validator({
+                'type': 'object',
+                'properties': early,
+            }) if early else None
         except Exception as e:
             raise Exception(self) from e
+        return state
+
+    def _validate(self, data, errors, state):
+        return state['_validator'].validate(data, errors)
 
-    def _validate(self, data, errors):
-        return self._validator.validate(data, errors)
+    def _validate_early(self, data, errors, state):
+        validator = state['_early_validator']
+        if validator is not None:
+            if errors is None:
+                errors = Errors()
+            # values are converted later by validation of all parameters
+            validator.validate(data, errors, convert=False)
+        return errors
+
+    @property
+    def validation_schema(self):
+        """ Schema of parameters for Validator """
+        return self._validator.schema
 
 
 def route_factory(method, handler, resource, *,
-                  expect_handler=None, **kwargs):
+                  expect_handler=None,
+                  route_class=SwaggerRoute,
+                  validation_route_class=SwaggerValidationRoute,
+                  **kwargs):
 
     ds_swagger_op = get_docstring_swagger(handler)
     if ds_swagger_op:
@@ -225,16 +556,18 @@ def route_factory(method, handler, resource, *,
     else:
         swagger_data = kwargs.get('swagger_data')
 
+    content_receiver = kwargs.get('content_receiver')
+
     if swagger_data is None:
         return Route(method, handler, resource=resource,
-                     expect_handler=expect_handler)
+                     expect_handler=expect_handler,
+                     content_receiver=content_receiver)
 
     elif kwargs.get('validate', True) is True:
-        route_class = SwaggerValidationRoute
-    else:
-        route_class = SwaggerRoute
+        route_class = validation_route_class
 
     route = route_class(method, handler, resource=resource,
                         expect_handler=expect_handler,
-                        swagger_data=swagger_data)
+                        swagger_data=swagger_data,
+                        content_receiver=content_receiver)
     return route
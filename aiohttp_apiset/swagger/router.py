@@ -1,18 +1,44 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
 import warnings
 from collections.abc import Mapping
-from typing import Any, Dict, Optional, Set  # noqa
+from contextlib import suppress
+from typing import Any, Dict, List, Optional, Set, Tuple  # noqa
 
 import yaml
 from aiohttp import hdrs, web
+from multidict import CIMultiDict
+from yarl import URL
 
 from .. import dispatcher, utils
-from ..middlewares import JsonEncoder
+from ..middlewares import JsonEncoder, Jsonify
 from . import ui
-from .loader import AllOf, FileLoader, FrozenDict, SchemaFile, SchemaPointer
+from .loader import (
+    AllOf,
+    FileLoader,
+    FrozenDict,
+    FrozenMap,
+    SchemaCache,
+    SchemaFile,
+    SchemaPointer,
+)
 from .operations import get_docstring_swagger
 from .route import SwaggerRoute, route_factory
 
 
+logger = logging.getLogger(__name__)
+
+BATCH_BODY_HEADERS = (
+    hdrs.CONTENT_LENGTH,
+    hdrs.CONTENT_TYPE,
+    hdrs.CONTENT_ENCODING,
+    hdrs.TRANSFER_ENCODING,
+)
+
+
 class JsonSerializer(JsonEncoder):
     converters = [
         (0, (AllOf, SchemaFile, SchemaPointer), lambda x: x.data),
@@ -28,7 +54,7 @@ class YamlSerializer(yaml.Dumper):
     )
 
     def represent_data(self, data):
-        if isinstance(data, FrozenDict):
+        if isinstance(data, (FrozenDict, FrozenMap)):
             return self.represent_dict(data)
         elif isinstance(data, self.attr_data):
             return self.represent_dict(data.data)
@@ -50,6 +76,20 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
     :param route_factory: factory for select route class and create route
     :param default_validate: if True and not specify in method then standart
         route_factory selected SwaggerValidationRoute
+    :param file_loader: loader of specification files
+    :param spec_url: url of specification for swagger-ui
+    :param schema_cache: instance of SchemaCache for default file_loader,
+        if None then process-wide cache is used
+    :param lazy_load: if True then default file_loader resolves only
+        operations of routes, the rest of specification is loaded
+        on first request of spec
+    :param ui_cache_size: max count of rendered pages of swagger-ui
+    :param response_sampler: instance of ResponseSampler for validation
+        of responses of swagger routes
+    :param serialize_responses: if True then result of handler is
+        projected to responses.200.schema of operation before jsonify
+    :param early_reject: if True then request with invalid path, query
+        or header parameters is rejected before reading of body
     """
     INCLUDE = '$include'
     VIEW = '$view'
@@ -61,17 +101,27 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
                  search_dirs=None, swagger_ui='/apidoc/', version_ui=2,
                  route_factory=route_factory,
                  encoding=None, default_validate=True,
-                 file_loader=None, spec_url=None):
+                 file_loader=None, spec_url=None, schema_cache=None,
+                 lazy_load=False, ui_cache_size=32,
+                 response_sampler=None, serialize_responses=False,
+                 early_reject=False):
         super().__init__(route_factory=route_factory)
         self.app = None  # type: Optional[web.Application]
         self._encoding = encoding  # type: str
         self._swagger_data = {}  # type: Dict[str, Any]
         self._default_validate = default_validate
         self._spec_url = spec_url
+        self._includes = []  # type: List[Tuple[Any, Dict[str, Any]]]
+        self._operations = {}  # type: Dict[Tuple[str, str], Tuple[Any, Any]]
+        self._specs_loaded = True
+        self._response_sampler = response_sampler
+        self._serialize_responses = serialize_responses
+        self._early_reject = early_reject
 
         if file_loader is None:
             cls = FileLoader.class_factory(include=self.INCLUDE)
-            file_loader = cls(encoding=encoding)
+            file_loader = cls(
+                encoding=encoding, cache=schema_cache, lazy=lazy_load)
         for sd in search_dirs or ():
             file_loader.add_search_dir(sd)
         self._file_loader = file_loader
@@ -99,10 +149,12 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
                 swagger_ui + '{filename:.*\.(json|yaml|yml)}',
                 self._handler_file_loader, name='swagger:specs')
             self.add_static(
-                swagger_ui, ui.STATIC_UI, name='swagger:ui:static')
-            ui.get_template()  # warm up
+                swagger_ui, ui.STATIC_UI, name='swagger:ui:static',
+                precompressed=True)
+            ui.get_segments()  # warm up
         self._swagger_ui = swagger_ui
         self._version_ui = version_ui
+        self._ui_cache = utils.LRUCache(ui_cache_size)
 
         if path:
             warnings.warn(
@@ -111,12 +163,29 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
                 DeprecationWarning, stacklevel=2)
             self.include(path)
 
+    @property
+    def schema_cache(self) -> SchemaCache:
+        return self._file_loader.cache
+
+    def _load_specs(self):
+        """ Completes specifications included in lazy mode """
+        if self._specs_loaded:
+            return
+        for spec, kwargs in self._includes:
+            self._load_operations(spec, lazy=False, **kwargs)
+        self._specs_loaded = True
+
     def _handler_file_loader(self, request):
+        self._load_specs()
         filename = request.match_info['filename']
-        spec = self._file_loader[filename].data
+        try:
+            spec = self._file_loader[filename].data
+        except KeyError:
+            raise web.HTTPNotFound()
         return self._response(spec)
 
     def _handler_swagger_spec(self, request):
+        self._load_specs()
         key = request.query.get('spec')
         format = request.path.split('.')[-1]
         if key is None and self._swagger_data:
@@ -205,6 +274,27 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
             enum: [2,3,4,5]
         """
         version = version or self._version_ui
+        if self._spec_url:
+            key = version, None  # type: tuple
+        else:
+            key = (
+                version, spec, request.scheme, request.host,
+                request.headers.get(hdrs.X_FORWARDED_PROTO),
+            )
+        try:
+            etag, text = self._ui_cache[key]
+        except KeyError:
+            text = self._rend_swagger_ui(request, spec, version)
+            digest = hashlib.sha1(text.encode()).hexdigest()
+            etag = '"{}"'.format(digest[:20])
+            self._ui_cache[key] = etag, text
+        if dispatcher.not_modified(request, etag):
+            return web.Response(status=304, headers={hdrs.ETAG: etag})
+        return web.Response(
+            text=text, content_type='text/html',
+            headers={hdrs.ETAG: etag})
+
+    def _rend_swagger_ui(self, request, spec, version):
         if self._spec_url:
             spec_url = self._spec_url
         else:
@@ -220,11 +310,9 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
             else:
                 spec_url = spec_url.with_query(spec='/')
             spec_url = spec_url.human_repr()
-        return web.Response(
-            text=ui.rend_template(spec_url,
-                                  prefix=self._swagger_ui,
-                                  version=version),
-            content_type='text/html')
+        return ui.rend_template(spec_url,
+                                prefix=self._swagger_ui,
+                                version=version)
 
     def include(self, spec, *,
                 basePath=None,
@@ -237,8 +325,41 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
         :param operationId_mapping: mapping for handlers
         :param name: name to access original spec
         """
+        kwargs = dict(
+            basePath=basePath,
+            operationId_mapping=operationId_mapping,
+            name=name,
+        )
+        operations = self._load_operations(spec, views=True, **kwargs)
+        self._includes.append((spec, kwargs))
+
+        for key, (handler, name, body, validate) in operations.items():
+            method, url = key
+            route = self.add_route(
+                method, url,
+                handler=handler,
+                name=name,
+                swagger_data=body,
+                validate=validate,
+            )
+            self._operations[key] = handler, route
 
-        data = self._file_loader.load(spec)
+        for route in self.routes():
+            if isinstance(route, SwaggerRoute) and not route.is_built:
+                route.build_swagger_data(self._file_loader)
+        self._ui_cache.clear()
+
+    def _load_operations(self, spec, *,
+                         basePath=None,
+                         operationId_mapping=None,
+                         name=None,
+                         views=False,
+                         lazy=None):
+        if getattr(self._file_loader, 'lazy', False):
+            data = self._file_loader.load(spec, lazy=lazy)
+            self._specs_loaded = lazy is False
+        else:
+            data = self._file_loader.load(spec)
 
         if basePath is None:
             basePath = data.get('basePath', '')
@@ -252,6 +373,7 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
         swagger_data = {k: v for k, v in data.items() if k != 'paths'}
         swagger_data['basePath'] = basePath
 
+        operations = {}
         for url, methods in data.get('paths', {}).items():
             url = basePath + url
             methods = dict(methods)
@@ -259,8 +381,10 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
             parameters = methods.pop('parameters', [])
             for method, body in methods.items():
                 if method == self.VIEW:
-                    view = utils.import_obj(body)
-                    view.add_routes(self, prefix=url, encoding=self._encoding)
+                    if views:
+                        view = utils.import_obj(body)
+                        view.add_routes(
+                            self, prefix=url, encoding=self._encoding)
                     continue
                 body = dict(body)
                 if parameters:
@@ -276,18 +400,196 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
                             name = location_name or op_id
                 if handler:
                     validate = body.pop(self.VALIDATE, self._default_validate)
-                    self.add_route(
-                        method.upper(), utils.url_normolize(url),
-                        handler=handler,
-                        name=name,
-                        swagger_data=body,
-                        validate=validate,
-                    )
+                    key = method.upper(), utils.url_normolize(url)
+                    operations[key] = handler, name, body, validate
         self._swagger_data[basePath] = swagger_data
+        return operations
 
-        for route in self.routes():
-            if isinstance(route, SwaggerRoute) and not route.is_built:
+    def reload(self):
+        """ Reload changed specification files and rebuild routes
+        of changed operations. Routes are replaced synchronously,
+        so requests in progress are finished with old routes.
+
+        :return: list of added or changed routes
+        """
+        changed = self.schema_cache.changed()
+        if not changed:
+            return []
+        self.schema_cache.invalidate(changed)
+
+        operations = {}
+        for spec, kwargs in self._includes:
+            operations.update(self._load_operations(spec, **kwargs))
+
+        result = []
+        for key in set(self._operations).difference(operations):
+            handler, route = self._operations.pop(key)
+            route.location.unregister_route(route)
+
+        for key, (handler, name, body, validate) in operations.items():
+            old_handler, route = self._operations.get(key, (None, None))
+            if route is not None and old_handler == handler:
+                if route.update_swagger_data(body, self._file_loader):
+                    result.append(route)
+                continue
+            elif route is not None:
+                route.location.unregister_route(route)
+            method, url = key
+            route = self.add_route(
+                method, url,
+                handler=handler,
+                name=name,
+                swagger_data=body,
+                validate=validate,
+            )
+            if isinstance(route, SwaggerRoute):
                 route.build_swagger_data(self._file_loader)
+            self._operations[key] = handler, route
+            result.append(route)
+        self._ui_cache.clear()
+        return result
+
+    async def _watch(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                routes = self.reload()
+            except Exception:
+                logger.exception('Failed reload of specification')
+            else:
+                if routes:
+                    logger.info('Reloaded routes %r', routes)
+
+    def watch(self, app: web.Application, *, interval: float = 1.0):
+        """ Polls modification time of loaded specification files
+        and reloads them while application is running
+
+        :param app: instance of aiohttp.web.Application
+        :param interval: seconds between checks
+        """
+        async def ctx(app):
+            task = asyncio.ensure_future(self._watch(interval))
+            yield
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+        app.cleanup_ctx.append(ctx)
+
+    def add_batch(self, path, *, name='batch', concurrency=10,
+                  max_items=100, jsonify=None):
+        """ Adds route which runs array of operations in one request
+
+        Body of request is json array of objects with keys
+        method, path, query and body, response is json array
+        of objects with keys status and body. Every operation
+        runs through middlewares of application, status is taken only
+        from response, other results of handler get status 200.
+
+        :param path: url of batch route
+        :param name: name of route
+        :param concurrency: max count of operations running at once
+        :param max_items: max count of operations in request
+        :param jsonify: instance of Jsonify which converts results
+        :return: route
+        """
+        if jsonify is None:
+            jsonify = Jsonify()
+        route = None
+
+        async def run(request, template, item, semaphore):
+            if not isinstance(item, Mapping):
+                return {'status': 400, 'body': {'error': 'Not object'}}
+            method = str(item.get('method', 'GET')).upper()
+            url = URL(str(item.get('path', '')))
+            if url.is_absolute() or not url.path.startswith('/'):
+                return {'status': 400, 'body': {'error': 'Bad path'}}
+            query = item.get('query')
+            if isinstance(query, Mapping):
+                url = url.with_query([
+                    (k, str(i))
+                    for k, v in query.items()
+                    for i in (v if isinstance(v, list) else [v])
+                ])
+            headers = CIMultiDict(request.headers)
+            # headers of body belong to the batch itself
+            for h in BATCH_BODY_HEADERS:
+                headers.popall(h, None)
+            body = b''
+            if 'body' in item:
+                body = json.dumps(item['body']).encode()
+                headers[hdrs.CONTENT_TYPE] = 'application/json'
+                headers[hdrs.CONTENT_LENGTH] = str(len(body))
+            sub = template.clone(method=method, rel_url=url, headers=headers)
+            sub._read_bytes = body
+
+            async with semaphore:
+                match_info = await self.resolve(sub)
+                if match_info.route is route:
+                    return {'status': 400, 'body': {'error': 'Nested batch'}}
+                match_info.add_app(request.app)
+                match_info.freeze()
+                sub._match_info = match_info
+                try:
+                    h = await self._wrap_middlewares(
+                        match_info.handler, match_info.apps)
+                    response = await h(sub)
+                except web.HTTPException as ex:
+                    if ex.status < 400 and isinstance(ex.reason, str):
+                        response = ex
+                    else:
+                        response = jsonify.resolve_exception(ex)
+                except Exception:
+                    logger.exception('Error of batch operation %s %s',
+                                     method, url)
+                    response = jsonify.resolve_exception(
+                        web.HTTPInternalServerError())
+            return self._batch_result(response)
+
+        async def handler(request):
+            # request cannot be cloned after reading of body
+            template = request.clone()
+            try:
+                items = await request.json()
+            except ValueError:
+                raise web.HTTPBadRequest(reason='Bad json')
+            if not isinstance(items, list):
+                raise web.HTTPBadRequest(reason='Array expected')
+            elif len(items) > max_items:
+                raise web.HTTPRequestEntityTooLarge(
+                    max_size=max_items, actual_size=len(items))
+            semaphore = asyncio.Semaphore(concurrency)
+            results = await asyncio.gather(*(
+                run(request, template, item, semaphore) for item in items
+            ))
+            return jsonify.response(results)
+
+        route = super().add_route('POST', path, handler, name=name)
+        return route
+
+    @staticmethod
+    async def _wrap_middlewares(handler, apps):
+        """ Returns handler wrapped by middlewares of apps
+        in the same order as application does
+        """
+        for app in apps[::-1]:
+            for m in app.middlewares:
+                if getattr(m, '__middleware_version__', None) == 1:
+                    handler = functools.update_wrapper(
+                        functools.partial(m, handler=handler), handler)
+                else:
+                    handler = await m(app, handler)
+        return handler
+
+    @staticmethod
+    def _batch_result(response):
+        if not isinstance(response, web.Response):
+            # status of operation is set only by response
+            return {'status': 200, 'body': response}
+        body = response.text
+        if body and response.content_type == 'application/json':
+            body = json.loads(body)
+        return {'status': response.status, 'body': body}
 
     def add_search_dir(self, path):
         """Add directory for search specification files
@@ -324,6 +626,10 @@ class SwaggerRouter(dispatcher.TreeUrlDispatcher):
             swagger_data=swagger_data,
             validate=validate,
         )
+        if isinstance(route, SwaggerRoute):
+            route.response_sampler = self._response_sampler
+            route.serialize_response = self._serialize_responses
+            route.early_reject = self._early_reject
         return route
 
     def setup(self, app: web.Application):
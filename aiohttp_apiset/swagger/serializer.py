@@ -0,0 +1,156 @@
+import datetime
+import decimal
+import uuid
+from collections import ChainMap
+from collections.abc import Mapping
+
+
+MISSING = object()
+
+
+def _properties(schema):
+    if isinstance(schema, ChainMap):
+        parts = reversed(schema.maps)
+    else:
+        parts = [schema]
+    result = {}
+    for part in parts:
+        for sub in part.get('allOf') or ():
+            result.update(_properties(sub))
+        result.update(part.get('properties') or {})
+    return result
+
+
+def _additional(schema):
+    if isinstance(schema, ChainMap):
+        parts = schema.maps
+    else:
+        parts = [schema]
+    for part in parts:
+        if 'additionalProperties' in part:
+            return part['additionalProperties']
+    return False
+
+
+def _type(schema):
+    t = schema.get('type')
+    if t is None:
+        if schema.get('properties') or schema.get('allOf') or \
+                isinstance(schema, ChainMap):
+            return 'object'
+        elif 'items' in schema:
+            return 'array'
+    return t
+
+
+def _identity(value):
+    return value
+
+
+def _string(value):
+    if type(value) is str or value is None:
+        return value
+    elif isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    elif isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    elif isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+def _number(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def compile_serializer(schema, _compiled=None):
+    """ Returns function which converts object to data declared by schema
+
+    Properties of object are taken from mapping or from attributes
+    (dataclasses and other objects), undeclared fields are dropped
+    unless additionalProperties allows them.
+
+    >>> s = compile_serializer({
+    ...     'type': 'object',
+    ...     'properties': {'a': {'type': 'integer'}},
+    ... })
+    >>> s({'a': 1, 'b': 2})
+    {'a': 1}
+
+    :param schema: schema of response
+    :return: callable
+    """
+    if _compiled is None:
+        _compiled = {}
+    key = id(schema)
+    if key in _compiled:
+        cell = _compiled[key]
+        # recursive schema, function is known after compilation
+        return lambda value: cell[0](value)
+    cell = _compiled[key] = [None]
+
+    t = _type(schema)
+    if t == 'object':
+        result = _compile_object(schema, _compiled)
+    elif t == 'array':
+        items = schema.get('items')
+        if items:
+            item = compile_serializer(items, _compiled)
+
+            def result(value):
+                if value is None:
+                    return value
+                return [item(i) for i in value]
+        else:
+            result = _identity
+    elif t == 'string':
+        result = _string
+    elif t == 'number':
+        result = _number
+    else:
+        result = _identity
+    cell[0] = result
+    return result
+
+
+def _compile_object(schema, compiled):
+    fields = tuple(
+        (name, compile_serializer(sub, compiled))
+        for name, sub in _properties(schema).items()
+    )
+    additional = _additional(schema)
+    if isinstance(additional, Mapping):
+        extra = compile_serializer(additional, compiled)
+    elif additional is True:
+        extra = _identity
+    else:
+        extra = None
+    if not fields and extra in (None, _identity):
+        return _identity
+    names = frozenset(name for name, field in fields)
+
+    def serialize(value):
+        if value is None:
+            return value
+        result = {}
+        if isinstance(value, Mapping):
+            for name, field in fields:
+                v = value.get(name, MISSING)
+                if v is not MISSING:
+                    result[name] = field(v)
+            if extra is not None:
+                for k, v in value.items():
+                    if k not in names:
+                        result[k] = extra(v)
+        elif hasattr(value, '__dict__') or hasattr(value, '__slots__'):
+            for name, field in fields:
+                v = getattr(value, name, MISSING)
+                if v is not MISSING:
+                    result[name] = field(v)
+        else:
+            # not an object, left for validation of response
+            return value
+        return result
+    return serialize
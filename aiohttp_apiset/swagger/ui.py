@@ -1,3 +1,4 @@
+import re
 from functools import lru_cache
 from pathlib import Path
 
@@ -20,8 +21,23 @@ def get_template(version=2):
         return f.read()
 
 
+PLACEHOLDER = re.compile(r'\{\{(url|static_prefix)\}\}')
+
+
+@lru_cache()
+def get_segments(version=2):
+    """ Returns template splitted by placeholders,
+    odd segments are names of placeholders
+    """
+    return tuple(PLACEHOLDER.split(get_template(version)))
+
+
 def rend_template(url, prefix='', version=2):
-    template = get_template(version)
-    prefix += str(version) + '/'
-    template = template.replace('{{url}}', url)
-    return template.replace('{{static_prefix}}', prefix)
+    values = {
+        'url': url,
+        'static_prefix': prefix + str(version) + '/',
+    }
+    return ''.join(
+        values[s] if i % 2 else s
+        for i, s in enumerate(get_segments(version))
+    )
@@ -140,14 +140,16 @@ class Validator:
         if self.check_schema:
             self.validator.check_schema(schema)
 
-    def validate(self, value, errors):
+    def validate(self, value, errors, convert=True):
         for error in self.validator.descend(value, self.schema):
             if error.path:
                 path = tuple(error.path)
             else:
                 path = ()
             if isinstance(error.cause, ConvertTo):
-                if not path:
+                if not convert:
+                    continue
+                elif not path:
                     return error.cause.new_value
                 base = value
                 *path, tail = path
@@ -1,5 +1,6 @@
 import importlib
 import re
+from collections import OrderedDict
 from urllib import parse
 
 
@@ -63,3 +64,34 @@ def allOf(d):
     for i in d.pop('allOf', ()):
         d.update(i)
     return d
+
+
+class LRUCache(OrderedDict):
+    """ OrderedDict which drops least recently used items
+
+    >>> c = LRUCache(2)
+    >>> c['a'], c['b'] = 1, 2
+    >>> c['a']
+    1
+    >>> c['c'] = 3
+    >>> list(c)
+    ['a', 'c']
+
+    :param maxsize: max count of items, if None then unbounded
+    """
+
+    def __init__(self, maxsize=None):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self) > self.maxsize:
+                self.popitem(last=False)
@@ -8,9 +8,15 @@ import urllib.request
 import tempfile
 import zipfile
 import shutil
+import gzip
 import os
 import sys
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 VERSION = os.environ.get('SWAGGER_UI_VERSION', '2.2.10')
 PACKAGE = os.environ.get('PACKAGE', 'aiohttp_apiset')
 
@@ -36,6 +42,30 @@ REPLACE_STRINGS = [
 ]
 
 
+COMPRESS_EXTENSIONS = ('.js', '.css', '.html', '.map', '.json', '.svg')
+COMPRESS_MIN_SIZE = 1024
+
+
+def compress(directory=STATIC_DIR):
+    """ Writes .gz and .br (if brotli installed) siblings of static files
+    which are served by router to clients accepting these encodings
+    """
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < COMPRESS_MIN_SIZE:
+                continue
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data))
+
+
 def setup_ui(version=VERSION):
     template_dir = os.path.join(TEMPLATES_DIR, version[0])
     static_dir = os.path.join(STATIC_DIR, version[0])
@@ -74,6 +104,8 @@ def setup_ui(version=VERSION):
         with open(swagger_init, "wt") as f:
             f.write(s)
 
+    compress(static_dir)
+
 def delete():
     shutil.rmtree(TEMPLATES_DIR)
     shutil.rmtree(STATIC_DIR)
@@ -82,5 +114,7 @@ def delete():
 if __name__ == '__main__':
     if 'delete' in sys.argv:
         delete()
+    elif 'compress' in sys.argv:
+        compress()
     else:
         setup_ui()
@@ -1,4 +1,7 @@
+import gzip
 import json
+import os
+import threading
 from pathlib import Path
 
 import pytest
@@ -11,8 +14,10 @@ from aiohttp_apiset.dispatcher import (
     ContentReceiver,
     Location,
     Route,
+    StaticManifest,
     TreeResource,
     TreeUrlDispatcher,
+    blocking,
 )
 
 
@@ -20,6 +25,27 @@ def handler(request):
     return web.HTTPOk()
 
 
+class SingletonView:
+    singleton = True
+
+    def get(self):
+        return web.json_response(id(self))
+
+
+class PooledView:
+    pool_size = 1
+
+    def get(self):
+        return web.json_response([id(self), self.request.path])
+
+
+class BlockingView:
+    @blocking
+    def get(self):
+        return web.json_response(
+            threading.current_thread() is threading.main_thread())
+
+
 @pytest.fixture
 def dispatcher():
     d = TreeUrlDispatcher()
@@ -185,6 +211,34 @@ async def test_static_with_default(loop, aiohttp_client):
     assert responce.status == 200
 
 
+async def test_static_manifest_mode(loop, aiohttp_client):
+    f = Path(__file__)
+    dispatcher = TreeUrlDispatcher()
+    dispatcher.add_static('/static', f.parent, name='static', manifest=True)
+    dispatcher.add_static('/static2', f.parent, name='static2',
+                          default=f.name, manifest=True)
+    app = web.Application(router=dispatcher, loop=loop)
+    client = await aiohttp_client(app)
+
+    url = dispatcher['static'].url_for(filename=f.name)
+    responce = await client.get(url)
+    assert responce.status == 200
+
+    url = dispatcher['static'].url_for(filename='..' + f.name)
+    responce = await client.get(url)
+    assert responce.status == 403
+
+    for filename in ('/etc/passwd', '1/2/3', '', 'data'):
+        url = dispatcher['static'].url_for(filename=filename)
+        responce = await client.get(url)
+        assert responce.status == 404, filename
+
+    for filename in ('1/2/3', '', 'data'):
+        url = dispatcher['static2'].url_for(filename=filename)
+        responce = await client.get(url)
+        assert responce.status == 200, filename
+
+
 def test_similar_patterns():
     dispatcher = TreeUrlDispatcher()
     dispatcher.add_get('/{a}', handler)
@@ -310,6 +364,33 @@ async def test_content_receiver():
     assert list(cr)
 
 
+@pytest.mark.parametrize('content_type,result', [
+    ('application/json', 2),
+    ('application/vnd.api+json', 2),
+    ('application/merge-patch+json; charset=utf-8', 2),
+    ('application/x-custom', b'2'),
+    ('text/plain', None),
+])
+async def test_content_receiver_match(content_type, result):
+    async def raw_receiver(request):
+        return await request.read()
+
+    cr = ContentReceiver()
+    cr['application/*'] = raw_receiver
+    request = make_request('PUT', '/', headers={'Content-Type': content_type})
+    request._read_bytes = json.dumps(2).encode()
+    if result is None:
+        with pytest.raises(TypeError):
+            await cr.receive(request)
+    else:
+        assert result == await cr.receive(request)
+    assert content_type in cr._cache
+
+    cr['*/*'] = raw_receiver
+    assert not cr._cache
+    assert cr.resolve('text/plain') is raw_receiver
+
+
 async def test_set_content_receiver(loop):
     async def test_receiver(request):
         pass
@@ -329,3 +410,141 @@ async def test_dynamic_sort():
     req = make_request('GET', '/a/2-3.jpg')
     mi = await r.resolve(req)
     assert mi.route is route
+
+
+async def test_static_cache(loop, aiohttp_client, tmp_path):
+    small = tmp_path / 'small.txt'
+    small.write_bytes(b'small')
+    big = tmp_path / 'big.txt'
+    big.write_bytes(b'0' * 100)
+    dispatcher = TreeUrlDispatcher()
+    dispatcher.add_static(
+        '/static', tmp_path, name='static',
+        cache_file_size=10, cache_control='max-age=60')
+    app = web.Application(router=dispatcher, loop=loop)
+    client = await aiohttp_client(app)
+
+    url = dispatcher['static'].url_for(filename='small.txt')
+    response = await client.get(url)
+    assert response.status == 200
+    assert await response.read() == b'small'
+    assert response.headers[hdrs.CACHE_CONTROL] == 'max-age=60'
+    etag = response.headers[hdrs.ETAG]
+    last_modified = response.headers[hdrs.LAST_MODIFIED]
+
+    response = await client.get(url, headers={hdrs.IF_NONE_MATCH: etag})
+    assert response.status == 304
+    response = await client.get(
+        url, headers={hdrs.IF_MODIFIED_SINCE: last_modified})
+    assert response.status == 304
+    response = await client.get(url, headers={hdrs.IF_NONE_MATCH: '"x"'})
+    assert response.status == 200
+
+    small.write_bytes(b'changed')
+    os.utime(small, ns=(0, 0))
+    response = await client.get(url, headers={hdrs.IF_NONE_MATCH: etag})
+    assert response.status == 200
+    assert await response.read() == b'changed'
+
+    url = dispatcher['static'].url_for(filename='big.txt')
+    response = await client.get(url)
+    assert response.status == 200
+    assert await response.read() == b'0' * 100
+    assert response.headers[hdrs.CACHE_CONTROL] == 'max-age=60'
+
+
+@pytest.mark.parametrize('cache_file_size', [0, 1024])
+async def test_static_precompressed(
+    loop, aiohttp_client, tmp_path, cache_file_size,
+):
+    (tmp_path / 'app.js').write_bytes(b'plain')
+    (tmp_path / 'app.js.gz').write_bytes(gzip.compress(b'gzipped'))
+    dispatcher = TreeUrlDispatcher()
+    dispatcher.add_static(
+        '/static', tmp_path, name='static',
+        cache_file_size=cache_file_size, precompressed=True)
+    app = web.Application(router=dispatcher, loop=loop)
+    client = await aiohttp_client(app)
+    url = dispatcher['static'].url_for(filename='app.js')
+
+    response = await client.get(
+        url, headers={hdrs.ACCEPT_ENCODING: 'br, gzip'})
+    assert response.status == 200
+    assert response.headers[hdrs.CONTENT_ENCODING] == 'gzip'
+    assert response.headers[hdrs.VARY] == hdrs.ACCEPT_ENCODING
+    assert 'javascript' in response.content_type
+    assert await response.read() == b'gzipped'
+
+    response = await client.get(
+        url, headers={hdrs.ACCEPT_ENCODING: 'identity'})
+    assert hdrs.CONTENT_ENCODING not in response.headers
+    assert await response.read() == b'plain'
+
+
+def test_static_manifest(tmp_path):
+    (tmp_path / 'index.html').write_text('')
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a' / 'b.js').write_text('')
+    manifest = StaticManifest(tmp_path)
+    assert len(manifest) == 2
+    assert manifest.search('a/b.js') == 'a/b.js'
+    assert manifest.search('a//b.js') == 'a/b.js'
+    assert manifest.search('a/c.js') is None
+    assert manifest.search('a/c/d', 'index.html') == 'index.html'
+    assert manifest.search('a', 'b.js') == 'a/b.js'
+    assert manifest.search('', 'index.html') == 'index.html'
+
+    (tmp_path / 'a' / 'c.js').write_text('')
+    assert manifest.search('a/c.js') is None
+    manifest.refresh()
+    origin, f, st, encoding, ct = manifest.lookup('a/c.js')
+    assert origin == tmp_path / 'a' / 'c.js'
+    assert 'javascript' in ct
+
+
+@pytest.mark.parametrize('cache_file_size', [0, 1024])
+async def test_static_range(loop, aiohttp_client, tmp_path, cache_file_size):
+    (tmp_path / 'data.bin').write_bytes(bytes(range(100)))
+    dispatcher = TreeUrlDispatcher()
+    dispatcher.add_static(
+        '/static', tmp_path, name='static',
+        cache_file_size=cache_file_size)
+    app = web.Application(router=dispatcher, loop=loop)
+    client = await aiohttp_client(app)
+    url = dispatcher['static'].url_for(filename='data.bin')
+
+    response = await client.get(url, headers={hdrs.RANGE: 'bytes=10-19'})
+    assert response.status == 206
+    assert await response.read() == bytes(range(10, 20))
+
+    response = await client.get(url)
+    assert response.status == 200
+    assert response.headers[hdrs.ACCEPT_RANGES] == 'bytes'
+    last_modified = response.headers[hdrs.LAST_MODIFIED]
+    etag = response.headers[hdrs.ETAG]
+
+    response = await client.get(
+        url, headers={hdrs.IF_MODIFIED_SINCE: last_modified})
+    assert response.status == 304
+    response = await client.get(url, headers={hdrs.IF_NONE_MATCH: etag})
+    assert response.status == 304
+
+
+@pytest.mark.parametrize('view', [
+    'SingletonView',
+    'PooledView',
+    'BlockingView',
+])
+async def test_view_instance(aiohttp_client, view):
+    r = TreeUrlDispatcher()
+    r.add_get('/', 'tests.test_dispatcher.{}.get'.format(view))
+    app = web.Application(router=r)
+    client = await aiohttp_client(app)
+    results = []
+    for _ in range(2):
+        resp = await client.get('/')
+        assert resp.status == 200, (await resp.text())
+        results.append(await resp.json())
+    assert results[0] == results[1]
+    if view == 'BlockingView':
+        assert results[0] is False
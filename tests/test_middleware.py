@@ -2,7 +2,9 @@ import pytest
 from aiohttp import web
 
 from aiohttp_apiset import SwaggerRouter, middlewares
+from aiohttp_apiset.exceptions import ValidationError
 from aiohttp_apiset.middlewares import Jsonify, jsonify
+from aiohttp_apiset.utils import LRUCache
 
 
 @pytest.mark.parametrize('middlewares', [
@@ -101,3 +103,24 @@ async def test_binary(aiohttp_client, data):
     cli = await aiohttp_client(app)
     resp = await cli.get('/')
     assert resp.status == 200, await resp.text()
+
+
+def test_errors_cache():
+    j = Jsonify(errors_cache_size=1)
+    r1 = j.resolve_exception(ValidationError(a='b'))
+    r2 = j.resolve_exception(ValidationError(a='b'))
+    assert r1.status == r2.status == 400
+    assert r1.text == r2.text == '{"errors": {"a": ["b"]}}'
+    assert len(j._errors_cache) == 1
+    j.resolve_exception(ValidationError(a='c'))
+    assert len(j._errors_cache) == 1
+
+
+async def test_validation_error_render(monkeypatch):
+    monkeypatch.setattr(ValidationError, 'render_cache', LRUCache(2))
+    monkeypatch.setattr(ValidationError, 'dumps', lambda d: repr(d))
+    e = ValidationError(a='b')
+    assert e.render() == "{'errors': {'a': ['b']}}"
+    assert ValidationError(a='b').render() is e.render()
+    assert e.render(dumps=str) == "{'errors': {'a': ['b']}}"
+    assert len(ValidationError.render_cache) == 2
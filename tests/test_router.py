@@ -1,8 +1,16 @@
+import asyncio
+import dataclasses
+import datetime
+import os
 from pathlib import Path
 
-from aiohttp import web
+import pytest
+from aiohttp import hdrs, web
 
 from aiohttp_apiset import SwaggerRouter
+from aiohttp_apiset.middlewares import jsonify
+from aiohttp_apiset.swagger.loader import SchemaCache
+from aiohttp_apiset.swagger.serializer import compile_serializer
 
 
 def test_app(loop, swagger_router):
@@ -80,3 +88,311 @@ def test_add_static():
     router = SwaggerRouter()
     a = web.Application(router=router)
     a.add_routes([web.static("/", Path(__file__).parent)])
+
+
+SPEC = """
+swagger: '2.0'
+basePath: /api
+paths:
+  /a:
+    get:
+      $handler: tests.conftest.SimpleView.post
+      parameters:
+        - name: q
+          in: query
+          type: {}
+"""
+
+
+def test_reload(tmp_path):
+    spec = tmp_path / 'spec.yaml'
+    spec.write_text(SPEC.format('string'))
+    router = SwaggerRouter(
+        search_dirs=[tmp_path],
+        swagger_ui=False,
+        schema_cache=SchemaCache(),
+    )
+    router.include('spec.yaml')
+    route, = router.routes()
+    assert route._parameters['q']['type'] == 'string'
+    assert router.reload() == []
+
+    spec.write_text(SPEC.format('integer') + """
+  /b:
+    post:
+      $handler: tests.conftest.handler
+""")
+    os.utime(spec, ns=(0, 0))
+    changed = router.reload()
+    assert route in changed
+    assert route._parameters['q']['type'] == 'integer'
+    urls = [(r.method, r.url()) for r in router.routes()]
+    assert ('POST', '/api/b') in urls
+
+    spec.write_text(SPEC.format('integer'))
+    os.utime(spec, ns=(1, 1))
+    assert router.reload() == []
+    urls = [(r.method, r.url()) for r in router.routes()]
+    assert urls == [('GET', '/api/a')]
+
+
+async def test_lazy_load(aiohttp_client):
+    router = SwaggerRouter(
+        search_dirs=['tests'],
+        swagger_ui='apidoc',
+        schema_cache=SchemaCache(),
+        lazy_load=True,
+    )
+    router.include('data/root.yaml')
+    assert 'Defi' not in router._swagger_data['/api/1']['definitions']
+    assert router['file:simple:view']._routes['GET']._parameters
+
+    app = web.Application(router=router)
+    cli = await aiohttp_client(app)
+    url = router['swagger:spec:json'].url_for().with_query(spec='/api/1')
+    resp = await cli.get(url)
+    assert resp.status == 200, (await resp.text())
+    spec = await resp.json()
+    assert 'Defi' in spec['definitions']
+
+
+@pytest.mark.parametrize('lazy_load', [False, True])
+async def test_spec_files_bounded_cache(aiohttp_client, lazy_load):
+    cache = SchemaCache(maxsize=2)
+    router = SwaggerRouter(
+        search_dirs=['tests'],
+        swagger_ui='apidoc',
+        schema_cache=cache,
+        lazy_load=lazy_load,
+    )
+    router.include('data/root.yaml')
+    app = web.Application(router=router)
+    cli = await aiohttp_client(app)
+    for name in ('data/root.yaml', 'data/include.yaml'):
+        resp = await cli.get('/apidoc/' + name)
+        assert resp.status == 200, name
+    resp = await cli.get('/apidoc/data/unknown.yaml')
+    assert resp.status == 404
+
+    router.freeze()
+    cache.clear()
+    assert not cache.files
+    resp = await cli.get('/apidoc/data/root.yaml')
+    assert resp.status == 200
+    assert 'paths' in (await resp.json())
+    url = router['swagger:spec:json'].url_for().with_query(spec='/api/1')
+    resp = await cli.get(url)
+    assert resp.status == 200
+    assert 'Defi' in (await resp.json())['definitions']
+
+
+async def test_swagger_ui_cache(aiohttp_client):
+    router = SwaggerRouter(search_dirs=['tests'], ui_cache_size=1)
+    router.include('data/root.yaml')
+    app = web.Application(router=router)
+    cli = await aiohttp_client(app)
+    url = router['swagger:ui'].url_for()
+
+    resp = await cli.get(url)
+    assert resp.status == 200, (await resp.text())
+    etag = resp.headers[hdrs.ETAG]
+    assert len(router._ui_cache) == 1
+
+    resp = await cli.get(url, headers={hdrs.IF_NONE_MATCH: etag})
+    assert resp.status == 304
+
+    resp = await cli.get(url.with_query(spec='/api/1', version=3))
+    assert resp.status == 200
+    assert len(router._ui_cache) == 1
+
+
+async def test_batch(aiohttp_client):
+    async def handler(a, body=None):
+        return {'a': a, 'body': body}
+
+    async def status(request):
+        # status of domain object is not status of operation
+        return {'id': 1, 'status': 3}
+
+    router = SwaggerRouter(swagger_ui=False)
+    parameters = [{'name': 'a', 'in': 'query', 'type': 'integer',
+                   'required': True}]
+    router.add_get('/a', handler, swagger_data={'parameters': parameters})
+    router.add_post('/a', handler, swagger_data={'parameters': parameters + [
+        {'name': 'body', 'in': 'body', 'schema': {'type': 'object'}},
+    ]})
+    router.add_get('/status', status)
+    router.add_batch('/batch', concurrency=2, max_items=10)
+    app = web.Application(router=router)
+    cli = await aiohttp_client(app)
+
+    resp = await cli.post('/batch', json=[
+        {'method': 'GET', 'path': '/a', 'query': {'a': 1}},
+        {'method': 'POST', 'path': '/a?a=2', 'body': {'b': 1}},
+        {'method': 'POST', 'path': '/a?a=3'},
+        {'path': '/status'},
+        {'path': '/a', 'query': {'a': 'x'}},
+        {'path': '/b'},
+        {'method': 'POST', 'path': '/batch', 'body': []},
+        {'path': 'http://example.com/a'},
+    ])
+    assert resp.status == 200, (await resp.text())
+    results = await resp.json()
+    assert results[0] == {'status': 200, 'body': {'a': 1, 'body': None}}
+    assert results[1] == {'status': 200, 'body': {'a': 2, 'body': {'b': 1}}}
+    assert results[2] == {'status': 200, 'body': {'a': 3, 'body': None}}
+    assert results[3] == {'status': 200, 'body': {'id': 1, 'status': 3}}
+    assert results[4]['status'] == 400
+    assert 'a' in results[4]['body']['errors']
+    assert [r['status'] for r in results[5:]] == [404, 400, 400]
+
+    resp = await cli.post('/batch', json=[{}] * 11)
+    assert resp.status == 413
+    resp = await cli.post('/batch', json={})
+    assert resp.status == 400
+
+
+async def test_batch_middlewares(aiohttp_client):
+    async def handler(request):
+        return {'path': request.path}
+
+    async def fail(request):
+        raise ValueError('fail')
+
+    @web.middleware
+    async def auth(request, handler):
+        if request.path == '/secret':
+            raise web.HTTPForbidden()
+        return await handler(request)
+
+    router = SwaggerRouter(swagger_ui=False)
+    router.add_get('/a', handler)
+    router.add_get('/secret', handler)
+    router.add_get('/fail', fail)
+    router.add_batch('/batch')
+    app = web.Application(router=router, middlewares=[auth, jsonify])
+    cli = await aiohttp_client(app)
+
+    resp = await cli.post('/batch', json=[
+        {'path': '/a'}, {'path': '/secret'}, {'path': '/fail'},
+    ])
+    assert resp.status == 200, (await resp.text())
+    a, secret, failed = await resp.json()
+    assert a == {'status': 200, 'body': {'path': '/a'}}
+    assert secret['status'] == 403
+    assert failed['status'] == 500
+
+
+@dataclasses.dataclass
+class Pet:
+    name: str
+    born: datetime.date
+    tags: list
+    secret: str = 'secret'
+
+
+async def get_pet():
+    return Pet('cat', datetime.date(2020, 1, 2), [{'id': 1, 'x': 2}])
+
+
+SERIALIZE_SPEC = """
+swagger: '2.0'
+basePath: /api
+paths:
+  /pet:
+    get:
+      $handler: tests.test_router.get_pet
+      responses:
+        200:
+          schema:
+            $ref: '#/definitions/Pet'
+definitions:
+  Pet:
+    type: object
+    properties:
+      name: {type: string}
+      born: {type: string, format: date}
+      tags: {type: array, items: {$ref: '#/definitions/Tag'}}
+  Tag:
+    properties:
+      id: {type: integer}
+"""
+
+
+async def test_serialize_responses(tmp_path, aiohttp_client):
+    (tmp_path / 'spec.yaml').write_text(SERIALIZE_SPEC)
+    router = SwaggerRouter(
+        search_dirs=[tmp_path],
+        swagger_ui=False,
+        schema_cache=SchemaCache(),
+        serialize_responses=True,
+    )
+    router.include('spec.yaml')
+    app = web.Application(router=router, middlewares=[jsonify])
+    cli = await aiohttp_client(app)
+    resp = await cli.get('/api/pet')
+    assert resp.status == 200, (await resp.text())
+    assert await resp.json() == {
+        'name': 'cat',
+        'born': '2020-01-02',
+        'tags': [{'id': 1}],
+    }
+
+
+def test_serializer_additional_properties():
+    schema = {'type': 'object', 'properties': {'a': {'type': 'integer'}}}
+    serialize = compile_serializer(dict(schema, additionalProperties=True))
+    assert serialize({'a': 1, 'b': 2}) == {'a': 1, 'b': 2}
+
+    serialize = compile_serializer(dict(schema, additionalProperties={
+        'type': 'string', 'format': 'date'}))
+    value = {'a': 1, 'b': datetime.date(2020, 1, 2)}
+    assert serialize(value) == {'a': 1, 'b': '2020-01-02'}
+
+    serialize = compile_serializer(dict(schema, additionalProperties=False))
+    assert serialize({'a': 1, 'b': 2}) == {'a': 1}
+    pet = Pet('cat', datetime.date(2020, 1, 2), [])
+    assert compile_serializer(
+        {'properties': {'name': {'type': 'string'}}})(pet) == {'name': 'cat'}
+
+    # value of wrong kind is left for validation of response
+    assert serialize([1, 2]) == [1, 2]
+    assert serialize('a') == 'a'
+
+
+async def test_rebuild_during_request(aiohttp_client):
+    receiving, release = asyncio.Event(), asyncio.Event()
+
+    async def receiver(request):
+        receiving.set()
+        await release.wait()
+        return await request.json()
+
+    async def handler(q, body):
+        return {'q': q, 'body': body}
+
+    def operation(q):
+        return {'parameters': [
+            dict(q, name='q', **{'in': 'query'}),
+            {'name': 'body', 'in': 'body', 'schema': {'type': 'object'}},
+        ]}
+
+    router = SwaggerRouter(swagger_ui=False)
+    router.set_content_receiver('application/json', receiver)
+    route = router.add_post(
+        '/', handler, swagger_data=operation({'type': 'string'}))
+    app = web.Application(router=router, middlewares=[jsonify])
+    cli = await aiohttp_client(app)
+
+    request = asyncio.ensure_future(cli.post('/?q=x', json={}))
+    await receiving.wait()
+    assert route.update_swagger_data(
+        operation({'type': 'integer', 'maximum': 1}), None)
+    release.set()
+    resp = await request
+    # request is validated by tables of operation it was started with
+    assert resp.status == 200, (await resp.text())
+    assert await resp.json() == {'q': 'x', 'body': {}}
+
+    resp = await cli.post('/?q=x', json={})
+    assert resp.status == 400, (await resp.text())
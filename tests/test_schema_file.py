@@ -1,14 +1,19 @@
+import tracemalloc
 from collections import OrderedDict
 from pathlib import Path
 
 import pytest
 
+from aiohttp_apiset import SwaggerRouter
 from aiohttp_apiset.swagger.loader import (
     AllOf,
+    CompactLoader,
     DictLoader,
     ExtendedSchemaFile,
     FileLoader,
+    FrozenMap,
     Loader,
+    SchemaCache,
     SchemaFile,
     yaml,
 )
@@ -127,3 +132,160 @@ def test_load_local_refs(swagger_router):
     assert FileLoader.local_refs
     assert ExtendedSchemaFile.files
     assert 'Defi' in result['definitions']
+
+
+def test_schema_cache_scope():
+    cache = SchemaCache()
+    router = SwaggerRouter(
+        search_dirs=['tests'],
+        swagger_ui=False,
+        schema_cache=cache,
+    )
+    router.include('data/root.yaml')
+    assert router.schema_cache is cache
+    assert cache.files
+    assert str(Path('data/include.yaml')) in cache.names
+    for path, f in cache.files.items():
+        assert f is not ExtendedSchemaFile.files.get(path)
+    router.freeze()
+    cache.clear()
+    assert not cache.files
+    assert not cache.data
+    assert router.routes()
+
+
+def test_schema_cache_maxsize():
+    cache = SchemaCache(maxsize=1)
+    loader = FileLoader(cache=cache)
+    d = Path(__file__).parent
+    loader.add_search_dir(d)
+    loader.add_search_dir(d / 'data')
+    assert loader.load('data/root.yaml')
+    assert len(cache.data) == 1
+    assert len(cache.files) == 1
+
+
+def test_resolve_memoized(tmp_path):
+    (tmp_path / 'a.yaml').write_text("""
+paths:
+  /a:
+    get:
+      parameters:
+        - $ref: 'b.yaml#/parameters/B'
+    post:
+      parameters:
+        - $ref: 'b.yaml#/parameters/B'
+definitions:
+  A:
+    properties:
+      b:
+        $ref: 'b.yaml#/definitions/B'
+""")
+    (tmp_path / 'b.yaml').write_text("""
+parameters:
+  B:
+    name: b
+    in: body
+    schema:
+      $ref: '#/definitions/B'
+definitions:
+  B:
+    properties:
+      a:
+        $ref: 'a.yaml#/definitions/A'
+""")
+    cache = SchemaCache()
+    f = ExtendedSchemaFile('a.yaml', dirs=[tmp_path], cache=cache)
+    data = f.resolve()
+    get, post = data['paths']['/a']['get'], data['paths']['/a']['post']
+    assert get['parameters'][0] is post['parameters'][0]
+    assert get['parameters'][0]['name'] == 'b'
+    b = data['definitions']['A']['properties']['b']
+    cycle = b['properties']['a']['properties']['b']
+    assert cycle['properties']['a'] == {'$ref': 'a.yaml#/definitions/A'}
+    assert cache.resolved_refs
+    assert not cache.resolving_refs
+
+
+def test_compact_loader():
+    data = yaml.load('a: {b: [{c: 1}]}', CompactLoader)
+    assert isinstance(data, FrozenMap)
+    assert isinstance(data['a']['b'][0], FrozenMap)
+    with pytest.raises(RuntimeError):
+        data['a'] = 1
+    with pytest.raises(RuntimeError):
+        data.update(a=1)
+    assert data == {'a': {'b': [{'c': 1}]}}
+
+
+def test_compact_router():
+    router = SwaggerRouter(
+        search_dirs=['tests'],
+        swagger_ui=False,
+        schema_cache=SchemaCache(yaml_loader=CompactLoader),
+    )
+    router.include('data/root.yaml')
+    assert isinstance(router.schema_cache.files.popitem()[1].data, FrozenMap)
+    assert router.routes()
+
+
+def test_compact_memory():
+    """ Compares memory of specification loaded with FrozenDict
+    and FrozenMap """
+    spec = ''.join(
+        """
+  /p{i}:
+    get:
+      description: operation {i}
+      parameters:
+        - name: q
+          in: query
+          type: string
+""".format(i=i)
+        for i in range(300)
+    )
+    spec = 'paths:' + spec
+
+    def measure(loader):
+        tracemalloc.start()
+        data = yaml.load(spec, loader)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert data
+        return size
+
+    frozen_dict = measure(Loader)
+    frozen_map = measure(CompactLoader)
+    assert frozen_map < frozen_dict * 0.8, (frozen_map, frozen_dict)
+
+
+def test_intern_strings():
+    stats = []
+
+    class StatsLoader(Loader):
+        stats_hook = stats.append
+
+    data = yaml.load("""
+        - {name: x-first-name, in: query}
+        - {name: x-first-name, in: query}
+        - {name: x-long, description: '%s'}
+    """ % ('long' * 100), StatsLoader)
+    assert data[0]['name'] is data[1]['name']
+    assert data[0]['in'] is data[1]['in']
+    stat, = stats
+    assert stat.duplicates
+    assert stat.saved
+    assert stat.strings == 11
+
+
+def test_paths_index():
+    d = Path(__file__).parent
+    f = ExtendedSchemaFile('data/root.yaml', dirs=[d])
+    paths = f['paths']
+    assert paths is f['paths']
+    assert 'get' in paths['/include2/inc/a']
+    assert 'get' in paths['/include3/inc/a']
+    with pytest.raises(KeyError):
+        paths['/include2/a']
+    with pytest.raises(KeyError):
+        paths['/incl']
@@ -1,6 +1,10 @@
+import asyncio
+import functools
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import aiohttp
 import multidict
 import pytest
 import yaml
@@ -8,10 +12,21 @@ from aiohttp import hdrs, web
 from aiohttp.test_utils import make_mocked_coro, make_mocked_request
 
 from aiohttp_apiset import SwaggerRouter
-from aiohttp_apiset.exceptions import Errors, ValidationError
+from aiohttp_apiset.dispatcher import (
+    JsonReceiver,
+    MultipartReceiver,
+    StreamReceiver,
+)
+from aiohttp_apiset.exceptions import NO_ERRORS, Errors, ValidationError
 from aiohttp_apiset.middlewares import jsonify
 from aiohttp_apiset.swagger.loader import Loader
-from aiohttp_apiset.swagger.route import SwaggerValidationRoute
+from aiohttp_apiset.swagger.pool import ValidationPool
+from aiohttp_apiset.swagger.route import (
+    ResponseSampler,
+    SwaggerRoute,
+    SwaggerValidationRoute,
+    route_factory,
+)
 from aiohttp_apiset.swagger.validate import Validator, convert
 
 
@@ -361,6 +376,60 @@ def test_errors():
     assert e.to_tree() == {'a': ['b'], 'c': ['d']}
 
 
+def test_errors_lazy():
+    e = Errors()
+    x, y = e['a', 'b'], e['a']['b']
+    assert not e
+    assert 'a' not in e
+    x.add('1')
+    y.add('2')
+    x.add('1')
+    assert e.to_tree() == {'a': {'b': ['1', '2']}}
+    assert 'a' in e
+    assert e['a', 'b'] is x
+    assert isinstance(ValidationError(), Errors)
+
+    assert not NO_ERRORS
+    with pytest.raises(RuntimeError):
+        NO_ERRORS['a'].add('1')
+    assert not NO_ERRORS
+
+
+def test_errors_eq():
+    a, b = ValidationError(a='x'), ValidationError(a='x')
+    assert a == a
+    assert a != b
+    assert len({a, b}) == 2
+    e = Errors('x', a='y')
+    assert e == e
+    assert e != Errors('x', a='y')
+    assert hash(e) == hash(e)
+
+
+async def test_validate_no_errors(mocker):
+    route = SwaggerValidationRoute(
+        'GET', handler, resource=None,
+        swagger_data={'parameters': parameters[:1]})
+    route.build_swagger_data(None)
+    request = make_mocked_request('GET', '/?road_id=1')
+    params, errors = await route.validate(request)
+    assert errors is NO_ERRORS
+    assert params == {'road_id': [1]}
+
+    # nothing may fail, collector of errors is not created
+    mocker.patch('aiohttp_apiset.swagger.route.Errors', side_effect=Exception)
+    route = SwaggerRoute(
+        'GET', handler, resource=None,
+        swagger_data={'parameters': [
+            {'name': 'q', 'in': 'query', 'type': 'string'},
+        ]})
+    route.build_swagger_data(None)
+    request = make_mocked_request('GET', '/?q=1')
+    params, errors = await route.validate(request)
+    assert errors is NO_ERRORS
+    assert params == {'q': '1'}
+
+
 async def test_bool(aiohttp_client):
     def handler(b):
         return web.json_response(b)
@@ -398,3 +467,254 @@ async def test_validation_errors_constructor(aiohttp_client):
     client = await aiohttp_client(app)
     r = await client.get('/')
     assert r.status == 400, (await r.text())
+
+
+async def test_multipart_receiver(aiohttp_client):
+    async def handler(name, upload):
+        data = await upload.read()
+        upload.close()
+        return web.json_response({
+            'name': name,
+            'filename': upload.filename,
+            'size': upload.size,
+            'in_memory': upload.in_memory,
+            'data': data.decode(),
+        })
+
+    r = SwaggerRouter()
+    r.set_content_receiver(
+        'multipart/form-data', MultipartReceiver(spool_size=4))
+    r.add_post('/', handler=handler, swagger_data={'parameters': [
+        {'name': 'name', 'in': 'formData', 'type': 'string'},
+        {'name': 'upload', 'in': 'formData', 'type': 'file',
+         'maxLength': 8},
+    ]})
+    app = web.Application(router=r)
+    client = await aiohttp_client(app)
+
+    form = aiohttp.FormData()
+    form.add_field('name', 'n')
+    form.add_field('upload', b'1234567', filename='f.txt')
+    resp = await client.post('/', data=form)
+    assert resp.status == 200, (await resp.text())
+    assert await resp.json() == {
+        'name': 'n', 'filename': 'f.txt', 'size': 7,
+        'in_memory': False, 'data': '1234567',
+    }
+
+    form = aiohttp.FormData()
+    form.add_field('upload', b'123456789', filename='f.txt')
+    resp = await client.post('/', data=form)
+    assert resp.status == 400, (await resp.text())
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+async def test_stream_receiver(aiohttp_client, chunked):
+    async def handler(body):
+        if chunked:
+            chunks = [bytes(chunk) async for chunk in body]
+        else:
+            chunks = [await body.read()]
+        return web.json_response(b''.join(chunks).decode())
+
+    r = SwaggerRouter()
+    r.set_content_receiver(
+        'application/octet-stream',
+        StreamReceiver(chunked=chunked, chunk_size=2))
+    r.add_post('/', handler=handler, swagger_data={'parameters': [
+        {'name': 'body', 'in': 'body', 'schema': {'type': 'file'}},
+    ]})
+    app = web.Application(router=r)
+    client = await aiohttp_client(app)
+    resp = await client.post('/', data=b'12345', headers={
+        hdrs.CONTENT_TYPE: 'application/octet-stream'})
+    assert resp.status == 200, (await resp.text())
+    assert await resp.json() == '12345'
+
+
+@pytest.mark.parametrize('handler,result', [
+    (lambda a, b: web.json_response([a, b]), [1, None]),
+    (lambda a, b=2: web.json_response([a, b]), [1, 2]),
+    (lambda a, **kw: web.json_response([a, kw.get('b')]), [1, None]),
+    (lambda request, a: web.json_response([a, request['a']]), [1, 1]),
+])
+async def test_handler_binding(aiohttp_client, handler, result):
+    r = SwaggerRouter()
+    r.add_get('/', handler=handler, swagger_data={'parameters': [
+        {'name': 'a', 'in': 'query', 'type': 'integer'},
+    ]})
+    app = web.Application(router=r)
+    client = await aiohttp_client(app)
+    resp = await client.get('/?a=1')
+    assert resp.status == 200, (await resp.text())
+    assert await resp.json() == result
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return super().submit(*args, **kwargs)
+
+
+async def test_offload_validation(aiohttp_client):
+    executor = CountingExecutor(1)
+
+    class Route(SwaggerValidationRoute):
+        offload_size = 10
+        offload_executor = executor
+
+    factory = functools.partial(route_factory, validation_route_class=Route)
+
+    async def handler(body):
+        return web.json_response(body)
+
+    r = SwaggerRouter(route_factory=factory)
+    r.set_content_receiver(
+        'application/json',
+        JsonReceiver(offload_size=10, executor=executor))
+    r.add_post('/', handler=handler, swagger_data={'parameters': [
+        {'name': 'body', 'in': 'body', 'required': True,
+         'schema': {'type': 'array', 'items': {'type': 'integer'}}},
+    ]})
+    app = web.Application(router=r)
+    client = await aiohttp_client(app)
+
+    resp = await client.post('/', json=[1])
+    assert resp.status == 200, (await resp.text())
+    assert executor.calls == 0
+
+    resp = await client.post('/', json=list(range(10)))
+    assert resp.status == 200, (await resp.text())
+    assert await resp.json() == list(range(10))
+    assert executor.calls == 2
+
+    resp = await client.post('/', json=['a'] * 10)
+    assert resp.status == 400, (await resp.text())
+    executor.shutdown()
+
+
+async def test_validation_pool(aiohttp_client):
+    pool = ValidationPool(1, min_size=10)
+
+    async def handler(q, body):
+        return web.json_response([q, body])
+
+    r = SwaggerRouter(route_factory=pool.route_factory, swagger_ui=False)
+    r.add_post('/', handler=handler, swagger_data={'parameters': [
+        {'name': 'q', 'in': 'query', 'type': 'integer'},
+        {'name': 'body', 'in': 'body', 'required': True,
+         'schema': {'type': 'array', 'items': {'type': 'integer'}}},
+    ]})
+    app = web.Application(router=r)
+    client = await aiohttp_client(app)
+    try:
+        resp = await client.post('/?q=1', json=[1])
+        assert resp.status == 200, (await resp.text())
+        assert pool._executor is None
+
+        resp = await client.post('/?q=1', json=list(range(10)))
+        assert resp.status == 200, (await resp.text())
+        assert await resp.json() == [1, list(range(10))]
+        assert pool._executor is not None
+
+        resp = await client.post('/', json=['a'] * 10)
+        assert resp.status == 400, (await resp.text())
+        assert '0' in (await resp.json())['errors']['body']
+
+        resp = await client.post('/', data=b'[' * 10, headers={
+            hdrs.CONTENT_TYPE: 'application/json'})
+        assert resp.status == 400, (await resp.text())
+        assert 'application/json' in (await resp.json())['errors']
+    finally:
+        pool.close()
+
+
+async def test_response_sampler(aiohttp_client):
+    mismatches = []
+    sampler = ResponseSampler(
+        lambda *args: mismatches.append(args), rate=1)
+
+    async def handler(a):
+        if a:
+            return web.json_response({'a': a})
+        return {'a': 'x'}
+
+    r = SwaggerRouter(swagger_ui=False, response_sampler=sampler)
+    route = r.add_get('/', handler=handler, swagger_data={
+        'parameters': [{'name': 'a', 'in': 'query', 'type': 'integer'}],
+        'responses': {200: {'schema': {
+            'type': 'object',
+            'properties': {'a': {'type': 'integer'}},
+        }}},
+    })
+    app = web.Application(router=r, middlewares=[jsonify])
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/?a=1')
+    assert resp.status == 200, (await resp.text())
+    resp = await client.get('/')
+    assert resp.status == 200, (await resp.text())
+    for _ in range(100):
+        if mismatches:
+            break
+        await asyncio.sleep(0.01)
+    assert len(mismatches) == 1
+    r, request, status, errors = mismatches[0]
+    assert r is route
+    assert status == 200
+    assert 'a' in errors
+
+    sampler.rate = 0
+    assert not sampler.sample()
+
+
+@pytest.mark.parametrize('early_reject', [False, True])
+async def test_early_reject(aiohttp_client, early_reject):
+    received = []
+
+    async def receiver(request):
+        received.append(request.path)
+        return await request.json()
+
+    async def handler(request):
+        return web.json_response(request.get('body'))
+
+    r = SwaggerRouter(swagger_ui=False, early_reject=early_reject)
+    r.set_content_receiver('application/json', receiver)
+    header = {'name': 'X-Id', 'in': 'header', 'type': 'integer',
+              'required': True}
+    r.add_post('/body', handler=handler, swagger_data={'parameters': [
+        {'name': 'body', 'in': 'body', 'schema': {'type': 'object'}},
+        header,
+        {'name': 'n', 'in': 'query', 'type': 'integer', 'maximum': 10},
+        {'name': 'kind', 'in': 'query', 'type': 'string',
+         'enum': ['a', 'b']},
+    ]})
+    r.add_post('/', handler=handler, swagger_data={'parameters': [header]})
+    app = web.Application(router=r)
+    client = await aiohttp_client(app)
+
+    resp = await client.post('/body', json={}, headers={'X-Id': '1'})
+    assert resp.status == 200, (await resp.text())
+    assert received == ['/body']
+
+    resp = await client.post('/body', json={})
+    assert resp.status == 400, (await resp.text())
+    assert len(received) == (1 if early_reject else 2)
+
+    resp = await client.post('/', json={}, headers={'X-Id': '1'})
+    assert resp.status == 200, (await resp.text())
+    assert len(received) == (1 if early_reject else 2)
+
+    for query in ({'n': 11}, {'kind': 'c'}):
+        resp = await client.post(
+            '/body', json={}, headers={'X-Id': '1'}, params=query)
+        assert resp.status == 400, (await resp.text())
+        assert list(query) == list((await resp.json())['errors'])
+    assert len(received) == (1 if early_reject else 4)
+
+    resp = await client.post(
+        '/body', json={}, headers={'X-Id': '1'}, params={'n': 10})
+    assert resp.status == 200, (await resp.text())